@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Long-lived streams such as /api/app/events/ (Server-Sent Events) must be
+served through this entry point rather than WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -50,12 +50,61 @@ MINIO_ENDPOINT = config("MINIO_ENDPOINT")
 MINIO_ACCESS_KEY = config("MINIO_ROOT_USER")
 MINIO_SECRET_KEY = config("MINIO_ROOT_PASSWORD")
 MINIO_USE_HTTPS = False
+MINIO_EXTERNAL_ENDPOINT = config("MINIO_EXTERNAL_ENDPOINT", default=MINIO_ENDPOINT)
+MINIO_EXTERNAL_ENDPOINT_USE_HTTPS = config(
+    "MINIO_EXTERNAL_ENDPOINT_USE_HTTPS", default=MINIO_USE_HTTPS, cast=bool
+)
+MINIO_REGION = config("MINIO_REGION", default="us-east-1")
 
 MINIO_PUBLIC_BUCKETS = ["mybucket"]
 MINIO_STORAGE_AUTO_CREATE_MEDIA_BUCKET = True
 
-REDIS_HOST = "127.0.0.1"
-REDIS_PORT = 6379
+REDIS_HOST = config("REDIS_HOST", default="127.0.0.1")
+REDIS_PORT = config("REDIS_PORT", default=6379, cast=int)
+REDIS_DB = config("REDIS_DB", default=0, cast=int)
+REDIS_PASSWORD = config("REDIS_PASSWORD", default=None)
+REDIS_MAX_CONNECTIONS = config("REDIS_MAX_CONNECTIONS", default=50, cast=int)
+REDIS_POOL_TIMEOUT = config("REDIS_POOL_TIMEOUT", default=0.5, cast=float)
+REDIS_CONNECT_TIMEOUT = config("REDIS_CONNECT_TIMEOUT", default=0.25, cast=float)
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", default=0.5, cast=float)
+REDIS_BREAKER_FAILURES = config("REDIS_BREAKER_FAILURES", default=5, cast=int)
+REDIS_BREAKER_RESET = config("REDIS_BREAKER_RESET", default=10, cast=float)
+
+SERVICE_CACHE_TTL = 300
+SERVICE_CACHE_NEGATIVE_TTL = 30
+SERVICE_CACHE_LOCAL_SIZE = 1024
+SERVICE_CACHE_LOCAL_TTL = 60
+SERVICE_BATCH_MAX = 50
+
+SERVICE_IMAGE_BUCKET = "mybucket"
+SERVICE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+SERVICE_IMAGE_CONTENT_TYPES = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+}
+SERVICE_IMAGE_UPLOAD_EXPIRES = 600
+
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_BASE = 2
+JOBS_BACKOFF_MAX = 300
+# Heartbeat lifetime; a worker silent for this long has its jobs requeued.
+JOBS_WORKER_TTL = 60
+JOBS_PERIODIC = {
+    "purge_stale_drafts": 3600,
+    "archive_applications": 86400,
+    "reconcile_capacity": 300,
+}
+
+DRAFT_TTL_DAYS = 30
+ARCHIVE_AFTER_DAYS = 180
+
+APPLICATION_CLAIM_LEASE = 600
+APPLICATION_CLAIM_MAX = 50
+
+APPLICATION_SYNC_PAGE_SIZE = 500
+APPLICATION_ARCHIVE_PAGE_SIZE = 500
+APPLICATION_SYNC_SAFETY_WINDOW = 2
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
@@ -75,14 +124,34 @@ CORS_ALLOW_CREDENTIALS = True
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "vps_rental.middleware.StaticFilesMiddleware",
+    "vps_rental.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "vps_rental.middleware.ProfilingMiddleware",
 ]
 
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_BROTLI_QUALITY = 5
+CATALOG_CACHE_TTL = 30
+SCHEMA_CACHE_TTL = 300
+
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+PROFILING_TTL = 3600
+PROFILING_KEEP = 100
+
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+BATCH_CLOSE_TIMEOUT = 5
+
+IDEMPOTENCY_TTL = 86400
+IDEMPOTENCY_LOCK_TTL = 30
+IDEMPOTENCY_WAIT = 5
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -158,6 +227,20 @@ STATICFILES_DIRS = [
     BASE_DIR / "vps_rental/static",
 ]
 
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Unhashed names stay reachable but are only cached briefly.
+STATIC_MAX_AGE = 60
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "vps_rental.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -15,12 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from vps_rental.compression import cache_compressed
+
 schema_view = get_schema_view(
     openapi.Info(
         title="API",
@@ -43,4 +46,11 @@ urlpatterns = [
         schema_view.with_ui("swagger", cache_timeout=0),
         name="schema-swagger-ui",
     ),
+    re_path(
+        r"^docs/swagger(?P<format>\.json|\.yaml)$",
+        cache_compressed("schema", settings.SCHEMA_CACHE_TTL)(
+            schema_view.without_ui(cache_timeout=0)
+        ),
+        name="schema-json",
+    ),
 ]
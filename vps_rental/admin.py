@@ -1,11 +1,43 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
 from .models import Application, ApplicationService, Service
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Reports the planner's row estimate instead of an exact COUNT(*) for
+    unfiltered changelists over large tables.
+    """
+
+    exact_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate > self.exact_threshold:
+                return estimate
+        return super().count
+
+
+def estimated_count(model):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed.
+    return row[0] if row else -1
+
+
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ("name", "image", "price", "is_active")
     ordering = ("id",)
+    search_fields = ("^name",)
 
 
 class ApplicationAdmin(admin.ModelAdmin):
@@ -17,7 +49,12 @@ class ApplicationAdmin(admin.ModelAdmin):
         "user_creator",
         "user_moderator",
     )
+    list_filter = ("status", "created_at")
+    list_select_related = ("user_creator", "user_moderator")
+    raw_id_fields = ("user_creator", "user_moderator")
     ordering = ("created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_status_name(self, obj):
         return obj.get_status_display()
@@ -27,6 +64,11 @@ class ApplicationAdmin(admin.ModelAdmin):
 
 class ApplicationServiceAdmin(admin.ModelAdmin):
     list_display = ("id", "application", "get_service_name")
+    list_select_related = ("application", "service")
+    raw_id_fields = ("application", "service")
+    search_fields = ("^service__name",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_service_name(self, obj):
         return f"Характеристика: {obj.service.name}"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VpsRentalConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "vps_rental"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,152 @@
+import logging
+import re
+
+import redis
+
+from . import popularity
+from .models import Service
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "autocomplete:services"
+NAMES_KEY = "autocomplete:services:names"
+TERMS_KEY = "autocomplete:services:terms:{id}"
+SEARCH_FIELDS = ["name", "processor", "ram", "disk"]
+LEX_MAX = "\U0010ffff"
+# Upper bound on index members ranked per lookup. The script runs inside
+# Redis, so short prefixes must not walk the whole index.
+SCAN_LIMIT = 500
+
+WORD_RE = re.compile(r"\w+")
+
+# Ranks the first ARGV[4] members of KEYS[1] in the lex range
+# [ARGV[1], ARGV[2]] by the service's score in KEYS[2] and returns the top
+# ARGV[3] service ids. Ties keep lexicographic order.
+SUGGEST_SCRIPT = redis_client.register_script(
+    """
+local members = redis.call(
+    'ZRANGEBYLEX', KEYS[1], ARGV[1], ARGV[2], 'LIMIT', 0, ARGV[4]
+)
+local limit = tonumber(ARGV[3])
+local seen, top = {}, {}
+for _, member in ipairs(members) do
+    local id = string.match(member, ':(%d+)$')
+    if id and not seen[id] then
+        seen[id] = true
+        local score = tonumber(redis.call('ZSCORE', KEYS[2], id) or 0)
+        local pos = #top + 1
+        while pos > 1 and top[pos - 1][2] < score do
+            pos = pos - 1
+        end
+        if pos <= limit then
+            table.insert(top, pos, {id, score})
+            if #top > limit then
+                table.remove(top)
+            end
+        end
+    end
+end
+local ids = {}
+for i, item in ipairs(top) do
+    ids[i] = item[1]
+end
+return ids
+"""
+)
+
+
+def service_terms(service):
+    name = service.name.lower().strip()
+    terms = {name} if name else set()
+    for field in SEARCH_FIELDS:
+        terms.update(WORD_RE.findall(getattr(service, field).lower()))
+    return {f"{term}:{service.pk}" for term in terms}
+
+
+def index_service(service):
+    if not service.is_active:
+        remove_service(service.pk)
+        return
+
+    terms_key = TERMS_KEY.format(id=service.pk)
+    members = service_terms(service)
+    stale = redis_client.smembers(terms_key) - members
+
+    pipe = redis_client.pipeline()
+    if stale:
+        pipe.zrem(INDEX_KEY, *stale)
+        pipe.srem(terms_key, *stale)
+    pipe.zadd(INDEX_KEY, {member: 0 for member in members})
+    pipe.sadd(terms_key, *members)
+    pipe.hset(NAMES_KEY, service.pk, service.name)
+    pipe.execute()
+
+
+def remove_service(service_id):
+    terms_key = TERMS_KEY.format(id=service_id)
+    members = redis_client.smembers(terms_key)
+
+    pipe = redis_client.pipeline()
+    if members:
+        pipe.zrem(INDEX_KEY, *members)
+    pipe.delete(terms_key)
+    pipe.hdel(NAMES_KEY, service_id)
+    pipe.execute()
+
+
+def reindex_service(service):
+    try:
+        index_service(service)
+    except redis.RedisError:
+        logger.warning("Failed to update autocomplete for service %s", service.pk)
+
+
+def unindex_service(service_id):
+    try:
+        remove_service(service_id)
+    except redis.RedisError:
+        logger.warning("Failed to update autocomplete for service %s", service_id)
+
+
+def rebuild():
+    pipe = redis_client.pipeline()
+    for key in redis_client.scan_iter(TERMS_KEY.format(id="*")):
+        pipe.delete(key)
+    pipe.delete(INDEX_KEY, NAMES_KEY)
+    pipe.execute()
+    for service in Service.objects.filter(is_active=True).iterator():
+        index_service(service)
+
+
+def suggest(prefix, limit):
+    prefix = prefix.lower().strip()
+    if not prefix:
+        return []
+
+    # Among matches, most requested plans come first.
+    try:
+        ids = SUGGEST_SCRIPT(
+            keys=[INDEX_KEY, popularity.window_key("week")],
+            args=[f"[{prefix}", f"[{prefix}{LEX_MAX}", limit, SCAN_LIMIT],
+        )
+        names = redis_client.hmget(NAMES_KEY, ids) if ids else []
+    except redis.RedisError:
+        logger.warning("Autocomplete index unavailable, querying the database")
+        return suggest_from_db(prefix, limit)
+
+    return [
+        {"id": int(service_id), "name": name}
+        for service_id, name in zip(ids, names)
+        if name is not None
+    ]
+
+
+def suggest_from_db(prefix, limit):
+    """Name-prefix matches only; the per-word terms live in Redis alone."""
+    services = (
+        Service.objects.filter(is_active=True, name__istartswith=prefix)
+        .order_by("name")
+        .values_list("id", "name")[:limit]
+    )
+    return [{"id": service_id, "name": name} for service_id, name in services]
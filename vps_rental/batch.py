@@ -0,0 +1,205 @@
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+API_PREFIX = "/api/"
+BATCH_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+# Streaming, async and session-changing routes cannot share the batch's
+# request; the batch endpoint must not call itself.
+EXCLUDED_ROUTES = {
+    "batch",
+    "application-events",
+    "application-export",
+    "login",
+    "logout",
+    "register",
+}
+# Headers that describe the batch request itself, not its sub-requests.
+DROPPED_META = {
+    "CONTENT_LENGTH",
+    "CONTENT_TYPE",
+    "HTTP_ACCEPT_ENCODING",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "HTTP_IDEMPOTENCY_KEY",
+}
+
+
+class BatchError(ValueError):
+    pass
+
+
+class SubRequest:
+    def __init__(self, index, method, path, body, headers):
+        self.index = index
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers
+
+    @property
+    def is_read(self):
+        return self.method == "GET"
+
+
+def parse_batch(data):
+    if not isinstance(data, list) or not data:
+        raise BatchError("requests must be a non-empty list")
+    if len(data) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f"At most {settings.BATCH_MAX_REQUESTS} requests per batch")
+
+    sub_requests = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise BatchError(f"requests[{index}] must be an object with a path")
+        method = str(item.get("method", "GET")).upper()
+        if method not in BATCH_METHODS:
+            raise BatchError(f"requests[{index}]: unsupported method '{method}'")
+        headers = item.get("headers") or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"requests[{index}]: headers must be an object")
+        sub_requests.append(
+            SubRequest(index, method, item["path"], item.get("body"), headers)
+        )
+    return sub_requests
+
+
+def build_request(request, sub_request, path, query):
+    body = b""
+    if sub_request.body is not None:
+        body = json.dumps(sub_request.body).encode()
+
+    environ = {
+        key: value for key, value in request.META.items() if key not in DROPPED_META
+    }
+    environ.update(
+        {
+            "REQUEST_METHOD": sub_request.method,
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": query,
+            "HTTP_ACCEPT": "application/json",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+        }
+    )
+    for name, value in sub_request.headers.items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = str(value)
+
+    sub = WSGIRequest(environ)
+    # Authenticated once for the whole batch; CSRF was checked on the batch.
+    sub.COOKIES = request.COOKIES
+    sub.session = request.session
+    sub.user = request.user
+    sub._dont_enforce_csrf_checks = True
+    return sub
+
+
+def execute(request, sub_request):
+    url = urlsplit(sub_request.path)
+    if not url.path.startswith(API_PREFIX):
+        return result(sub_request, 404, {"detail": "Not found."})
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return result(sub_request, 404, {"detail": "Not found."})
+    if match.url_name in EXCLUDED_ROUTES:
+        return result(sub_request, 400, {"detail": "Route is not allowed in a batch"})
+
+    sub = build_request(request, sub_request, url.path, url.query)
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    except Exception as e:
+        return result(sub_request, 500, {"detail": str(e)})
+    if response.streaming:
+        return result(sub_request, 400, {"detail": "Streaming responses unsupported"})
+    return result(sub_request, response.status_code, response_body(response))
+
+
+def response_body(response):
+    if getattr(response, "data", None) is not None:
+        return response.data
+    if not response.content:
+        return None
+    try:
+        return json.loads(response.content)
+    except ValueError:
+        return response.content.decode(errors="replace")
+
+
+def result(sub_request, status_code, body):
+    return {
+        "method": sub_request.method,
+        "path": sub_request.path,
+        "status": status_code,
+        "body": body,
+    }
+
+
+def close_worker_connections(executor, workers):
+    """
+    Close the database connections opened by the worker threads, once per
+    thread. Every task waits on a barrier, so no thread runs two of them.
+    """
+    barrier = threading.Barrier(workers)
+
+    def close():
+        try:
+            barrier.wait(timeout=settings.BATCH_CLOSE_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+        connections.close_all()
+
+    for future in [executor.submit(close) for _ in range(workers)]:
+        future.result()
+
+
+def run_batch(request, sub_requests):
+    """
+    Run sub-requests in order. Consecutive GETs form a group that runs
+    concurrently; any write waits for the reads before it and blocks the
+    ones after it, so read-your-writes holds within a batch. Sub-requests
+    call their views directly and skip the middleware stack.
+    """
+    # Resolve the lazy user and session once, before threads share them.
+    request.user.is_authenticated
+
+    results = [None] * len(sub_requests)
+    workers = settings.BATCH_MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        threaded = False
+        try:
+            group = []
+            for sub_request in sub_requests + [None]:
+                if sub_request is not None and sub_request.is_read:
+                    group.append(sub_request)
+                    continue
+
+                if len(group) == 1:
+                    results[group[0].index] = execute(request, group[0])
+                elif group:
+                    threaded = True
+                    futures = {
+                        item.index: executor.submit(execute, request, item)
+                        for item in group
+                    }
+                    for index, future in futures.items():
+                        results[index] = future.result()
+                group = []
+
+                if sub_request is not None:
+                    results[sub_request.index] = execute(request, sub_request)
+        finally:
+            if threaded:
+                close_worker_connections(executor, workers)
+    return results
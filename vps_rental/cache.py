@@ -0,0 +1,249 @@
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from .utils import redis_client, release_lock
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is MISSING:
+                return MISSING
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache:
+    """
+    Per-process LRU in front of Redis.
+
+    Misses are recomputed by a single worker (Redis lock), hot keys are
+    refreshed early with probability growing towards expiry, and ``None``
+    results are cached for ``negative_ttl``. Invalidations are broadcast
+    over pub/sub so every process drops its local copy.
+    """
+
+    lock_timeout = 5
+    lock_wait = 1.0
+    poll_interval = 0.025
+    beta = 1.0
+
+    def __init__(self, namespace, ttl, negative_ttl, local_maxsize, local_ttl):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = LRUCache(local_maxsize, local_ttl)
+        self.channel = f"cache:{namespace}:invalidate"
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def _key(self, key):
+        return f"cache:{self.namespace}:{key}"
+
+    def _lock_key(self, key):
+        return f"cache:{self.namespace}:{key}:lock"
+
+    def get_or_load(self, key, loader):
+        key = str(key)
+        self._ensure_listener()
+
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+
+        try:
+            envelope = self._read(key)
+            if envelope is not None and not self._should_refresh(envelope):
+                return self._remember(key, envelope)
+            value = self._load_single_flight(key, loader, envelope)
+        except redis.RedisError:
+            logger.warning(
+                "Redis unavailable, loading %s:%s directly", self.namespace, key
+            )
+            value = loader()
+        self.local.set(key, value, self._local_ttl(value))
+        return value
+
+    def get_many(self, keys, loader):
+        """
+        Fetch several keys at once; ``loader`` receives the keys missing
+        from both tiers and returns a ``{key: value}`` dict for them.
+        """
+        keys = [str(key) for key in keys]
+        self._ensure_listener()
+
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not MISSING:
+                found[key] = value
+        pending = [key for key in keys if key not in found]
+        if not pending:
+            return found
+
+        try:
+            raws = redis_client.mget([self._key(key) for key in pending])
+            for key, raw in zip(pending, raws):
+                if raw:
+                    found[key] = self._remember(key, json.loads(raw))
+            pending = [key for key in pending if key not in found]
+            if not pending:
+                return found
+            loaded = self._load_many(pending, loader)
+        except redis.RedisError:
+            logger.warning("Redis unavailable, loading %s directly", self.namespace)
+            loaded = loader(pending)
+
+        for key in pending:
+            value = loaded.get(key)
+            self.local.set(key, value, self._local_ttl(value))
+            found[key] = value
+        return found
+
+    def _load_many(self, keys, loader):
+        started = time.monotonic()
+        loaded = {str(key): value for key, value in loader(keys).items()}
+        delta = time.monotonic() - started
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            envelope, ttl = self._envelope(loaded.get(key), delta)
+            pipe.set(self._key(key), envelope, ex=ttl)
+        pipe.execute()
+        return loaded
+
+    def invalidate(self, key):
+        key = str(key)
+        self.local.delete(key)
+        try:
+            redis_client.delete(self._key(key))
+            redis_client.publish(self.channel, key)
+        except redis.RedisError:
+            logger.warning("Failed to invalidate %s:%s", self.namespace, key)
+
+    def _read(self, key):
+        raw = redis_client.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    def _envelope(self, value, delta):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        envelope = {"value": value, "delta": delta, "expires": time.time() + ttl}
+        return json.dumps(envelope), ttl
+
+    def _write(self, key, value, delta):
+        envelope, ttl = self._envelope(value, delta)
+        redis_client.set(self._key(key), envelope, ex=ttl)
+
+    def _should_refresh(self, envelope):
+        # XFetch: recompute before expiry with probability rising as it nears.
+        gap = envelope["delta"] * self.beta * math.log(random.random() or 1e-12)
+        return time.time() - gap >= envelope["expires"]
+
+    def _remember(self, key, envelope):
+        value = envelope["value"]
+        self.local.set(key, value, self._local_ttl(value))
+        return value
+
+    def _local_ttl(self, value):
+        return min(self.local.ttl, self.negative_ttl) if value is None else None
+
+    def _load_single_flight(self, key, loader, stale):
+        token = uuid.uuid4().hex
+        lock_key = self._lock_key(key)
+        if redis_client.set(lock_key, token, nx=True, ex=self.lock_timeout):
+            try:
+                return self._compute(key, loader)
+            finally:
+                release_lock(lock_key, token)
+
+        if stale is not None:
+            return stale["value"]
+
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            envelope = self._read(key)
+            if envelope is not None:
+                return envelope["value"]
+        return self._compute(key, loader)
+
+    def _compute(self, key, loader):
+        started = time.monotonic()
+        value = loader()
+        self._write(key, value, time.monotonic() - started)
+        return value
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name=f"{self.channel}-listener", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Messages may have been missed while disconnected.
+                self.local.clear()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self.local.delete(message["data"])
+            except redis.RedisError:
+                self.local.clear()
+                time.sleep(1.0)
+            finally:
+                pubsub.close()
+
+
+service_cache = TwoTierCache(
+    "service",
+    ttl=settings.SERVICE_CACHE_TTL,
+    negative_ttl=settings.SERVICE_CACHE_NEGATIVE_TTL,
+    local_maxsize=settings.SERVICE_CACHE_LOCAL_SIZE,
+    local_ttl=settings.SERVICE_CACHE_LOCAL_TTL,
+)
@@ -0,0 +1,174 @@
+import logging
+from collections import Counter
+
+import redis
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import (ApplicationService, ApplicationStatus,
+                     ArchivedApplicationService, Service)
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+CAPACITY_KEY = "capacity:service:{id}"
+RESERVED_STATUSES = [ApplicationStatus.FORMED, ApplicationStatus.COMPLETED]
+
+# Returns 0 on success, i if KEYS[i] lacks capacity, -i if KEYS[i] is unset.
+RESERVE_SCRIPT = redis_client.register_script(
+    """
+for i, key in ipairs(KEYS) do
+    local remaining = redis.call('GET', key)
+    if remaining == false then
+        return -i
+    end
+    if tonumber(remaining) < tonumber(ARGV[i]) then
+        return i
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('DECRBY', key, ARGV[i])
+end
+return 0
+"""
+)
+
+RELEASE_SCRIPT = redis_client.register_script(
+    """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('INCRBY', key, ARGV[i])
+    end
+end
+return 0
+"""
+)
+
+
+class CapacityExceeded(Exception):
+    def __init__(self, service):
+        self.service = service
+        super().__init__(f"Недостаточно свободных мощностей для услуги '{service}'")
+
+
+def capacity_key(service_id):
+    return CAPACITY_KEY.format(id=service_id)
+
+
+def used_capacity(service_ids):
+    # Completed rentals keep their capacity after being archived.
+    used = Counter()
+    for model in (ApplicationService, ArchivedApplicationService):
+        rows = (
+            model.objects.filter(
+                service_id__in=service_ids, application__status__in=RESERVED_STATUSES
+            )
+            .values("service_id")
+            .annotate(used=Sum("quantity"))
+        )
+        used.update({row["service_id"]: row["used"] for row in rows})
+    return used
+
+
+def initialize(services):
+    used = used_capacity([service.pk for service in services])
+    pipe = redis_client.pipeline()
+    for service in services:
+        remaining = max(service.capacity - used.get(service.pk, 0), 0)
+        pipe.set(capacity_key(service.pk), remaining, nx=True)
+    pipe.execute()
+
+
+def limited_lines(application):
+    lines = application.services.select_related("service").filter(
+        service__capacity__isnull=False
+    )
+    return [(line.service, line.quantity) for line in lines]
+
+
+def reserve(application):
+    """
+    Atomically take capacity for every limited service in the application.
+    Returns the reserved lines so the caller can hand them back on rollback.
+    """
+    lines = limited_lines(application)
+    if not lines:
+        return []
+
+    keys = [capacity_key(service.pk) for service, _ in lines]
+    quantities = [quantity for _, quantity in lines]
+    try:
+        result = RESERVE_SCRIPT(keys=keys, args=quantities)
+        if result < 0:
+            # Counters are created lazily from the database on first use.
+            initialize([service for service, _ in lines])
+            result = RESERVE_SCRIPT(keys=keys, args=quantities)
+    except redis.RedisError:
+        logger.warning(
+            "Capacity store unavailable, forming %s unchecked", application.pk
+        )
+        return []
+    if result > 0:
+        raise CapacityExceeded(lines[result - 1][0])
+    return lines
+
+
+def release(lines):
+    if not lines:
+        return
+    try:
+        RELEASE_SCRIPT(
+            keys=[capacity_key(service.pk) for service, _ in lines],
+            args=[quantity for _, quantity in lines],
+        )
+    except redis.RedisError:
+        logger.warning("Failed to release capacity, reconcile will restore it")
+
+
+def release_on_commit(application):
+    """Hand back what a formed application held once it leaves the queue."""
+    lines = limited_lines(application)
+    transaction.on_commit(lambda: release(lines))
+
+
+def availability(services):
+    limited = [service for service in services if service.capacity is not None]
+    if not limited:
+        return {}
+    try:
+        values = redis_client.mget([capacity_key(service.pk) for service in limited])
+        missing = [service for service, value in zip(limited, values) if value is None]
+        if missing:
+            initialize(missing)
+            values = redis_client.mget(
+                [capacity_key(service.pk) for service in limited]
+            )
+    except redis.RedisError:
+        return {}
+    return {
+        service.pk: max(int(value), 0)
+        for service, value in zip(limited, values)
+        if value is not None
+    }
+
+
+def reset_capacity(service_id):
+    try:
+        redis_client.delete(capacity_key(service_id))
+    except redis.RedisError:
+        logger.warning("Failed to reset capacity for service %s", service_id)
+
+
+def reconcile():
+    """
+    Overwrite every counter with the value derived from the database.
+    Reservations taken but not yet committed are briefly counted as free.
+    """
+    services = list(Service.objects.filter(capacity__isnull=False))
+    used = used_capacity([service.pk for service in services])
+    pipe = redis_client.pipeline()
+    for service in services:
+        remaining = max(service.capacity - used.get(service.pk, 0), 0)
+        pipe.set(capacity_key(service.pk), remaining)
+    pipe.execute()
+    return len(services)
@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import logging
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from .utils import redis_binary_client
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "compressed:{name}:version"
+PAYLOAD_KEY = "compressed:{name}:{version}:{variant}"
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+# Only data renders are shared between users; the browsable API's HTML
+# carries the current user and their CSRF token.
+CACHEABLE_TYPES = ("application/json", "application/yaml")
+# Set per response from the body; everything else is replayed on a hit.
+UNSTORED_HEADERS = {"content-length", "content-encoding"}
+
+
+def available_encodings():
+    # In order of preference when the client accepts several equally.
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding, supported=None):
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in supported or available_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding, precompressed=False):
+    """
+    Precompressed payloads are built once per cache fill, so they use the
+    strongest levels; per-request compression favours speed.
+    """
+    if encoding == "br":
+        quality = 11 if precompressed else settings.COMPRESSION_BROTLI_QUALITY
+        return brotli.compress(data, quality=quality)
+    if precompressed:
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    # Random padding in the gzip header mitigates BREACH, as GZipMiddleware does.
+    return compress_string(data, max_random_bytes=100)
+
+
+def is_compressible(response):
+    if response.streaming or response.has_header("Content-Encoding"):
+        return False
+    content_type = response.get("Content-Type", "").split(";")[0].strip()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def is_cacheable(response):
+    content_type = response.get("Content-Type", "").split(";")[0].strip()
+    return content_type in CACHEABLE_TYPES
+
+
+def bump_version(name):
+    try:
+        redis_binary_client.incr(VERSION_KEY.format(name=name))
+    except redis.RedisError:
+        logger.warning("Failed to bump %s payload version", name)
+
+
+def payload_key(name, version, request):
+    variant = hashlib.sha1(
+        "\n".join(
+            [request.get_full_path(), request.META.get("HTTP_ACCEPT", "")]
+        ).encode()
+    ).hexdigest()
+    return PAYLOAD_KEY.format(name=name, version=version, variant=variant)
+
+
+def stored_headers(response):
+    return json.dumps(
+        {
+            name: value
+            for name, value in response.items()
+            if name.lower() not in UNSTORED_HEADERS
+        }
+    )
+
+
+def encoded_response(body, headers, encoding, response=None):
+    """Build a response, or swap the body of ``response`` keeping its headers."""
+    if response is None:
+        response = HttpResponse(body)
+        for name, value in json.loads(headers).items():
+            response[name] = value
+    else:
+        response.content = body
+        if response.has_header("Content-Length"):
+            response["Content-Length"] = str(len(body))
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+    return response
+
+
+def cache_compressed(name, ttl):
+    """
+    Cache a view's rendered 200 JSON or YAML responses and headers together
+    with their gzip and brotli encodings, so repeat hits skip both
+    serialization and compression. Entries are keyed by the
+    ``bump_version(name)`` counter, the full path and the Accept header, and
+    expire after ``ttl`` seconds.
+
+    Only path-stable payloads are worth the strongest levels. A query-string
+    variant is rarely requested twice, so it stores just the negotiated
+    encoding at the per-request level.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+            field = encoding or "identity"
+            try:
+                version = redis_binary_client.get(VERSION_KEY.format(name=name))
+                key = payload_key(name, int(version or 0), request)
+                headers, body = redis_binary_client.hmget(key, "headers", field)
+            except redis.RedisError:
+                logger.warning("Payload cache unavailable for %s", name)
+                return view(request, *args, **kwargs)
+            if body is not None and headers is not None:
+                return encoded_response(body, headers, encoding)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            if hasattr(response, "render"):
+                response.render()
+            if not is_cacheable(response):
+                return response
+
+            payload = {
+                "headers": stored_headers(response),
+                "identity": response.content,
+            }
+            if request.META.get("QUERY_STRING"):
+                if encoding:
+                    payload[encoding] = compress(response.content, encoding)
+            else:
+                for variant in available_encodings():
+                    payload[variant] = compress(response.content, variant, True)
+            try:
+                pipe = redis_binary_client.pipeline()
+                pipe.hset(key, mapping=payload)
+                pipe.expire(key, ttl)
+                pipe.execute()
+            except redis.RedisError:
+                logger.warning("Failed to store %s payload", name)
+            return encoded_response(payload[field], None, encoding, response)
+
+        return wrapped
+
+    return decorator
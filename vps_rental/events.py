@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import re
+
+import redis
+from django.db import transaction
+from django.utils import timezone
+
+from .utils import async_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+EVENTS_STREAM = "events:applications"
+EVENTS_STREAM_MAXLEN = 10000
+EVENTS_CHANNEL_PREFIX = "events:applications:"
+STAFF_CHANNEL = f"{EVENTS_CHANNEL_PREFIX}staff"
+REPLAY_PAGE_SIZE = 1000
+HEARTBEAT_INTERVAL = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+EVENT_ID_RE = re.compile(r"^\d+-\d+$")
+
+
+def user_channel(user_id):
+    return f"{EVENTS_CHANNEL_PREFIX}user:{user_id}"
+
+
+def publish_status_change(application, previous_status):
+    event = {
+        "application_id": application.pk,
+        "user_creator": application.user_creator_id,
+        "user_moderator": application.user_moderator_id,
+        "previous_status": previous_status,
+        "status": application.status,
+        "at": timezone.now().isoformat(),
+    }
+    transaction.on_commit(lambda: _publish(event))
+
+
+def _publish(event):
+    data = json.dumps(event)
+    try:
+        event_id = redis_client.xadd(
+            EVENTS_STREAM,
+            {"data": data},
+            maxlen=EVENTS_STREAM_MAXLEN,
+            approximate=True,
+        )
+        message = json.dumps({"id": event_id, "data": data})
+        pipe = redis_client.pipeline()
+        pipe.publish(user_channel(event["user_creator"]), message)
+        pipe.publish(STAFF_CHANNEL, message)
+        pipe.execute()
+    except redis.RedisError:
+        logger.exception("Failed to publish event for %s", event["application_id"])
+
+
+class EventHub:
+    """
+    One pattern subscription per process, fanned out to per-client queues.
+
+    Clients whose queue overflows, or who were connected while the hub lost
+    Redis, are disconnected so they reconnect and replay via Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self._task = None
+
+    def subscribe(self, channel):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        queue.closed = False
+        self.subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        queues = self.subscribers.get(channel)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[channel]
+
+    def _close(self, channel, queue):
+        queue.closed = True
+        self.unsubscribe(channel, queue)
+
+    def _close_all(self):
+        for channel, queues in list(self.subscribers.items()):
+            for queue in list(queues):
+                self._close(channel, queue)
+
+    async def _run(self):
+        while True:
+            pubsub = async_redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENTS_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    for queue in list(self.subscribers.get(channel, ())):
+                        try:
+                            queue.put_nowait(message["data"])
+                        except asyncio.QueueFull:
+                            self._close(channel, queue)
+            except redis.RedisError:
+                logger.warning("Event hub lost Redis, dropping subscribers")
+                self._close_all()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+event_hub = EventHub()
+
+
+def format_event(event_id, data):
+    return f"id: {event_id}\nevent: status\ndata: {data}\n\n"
+
+
+async def replay_events(user, last_event_id):
+    """
+    Page through the shared stream up to its tip. Most entries belong to
+    other users, so a fixed read limit would silently drop this user's
+    events after a busy period.
+    """
+    cursor = last_event_id
+    while True:
+        entries = await async_redis_client.xrange(
+            EVENTS_STREAM, min=f"({cursor}", count=REPLAY_PAGE_SIZE
+        )
+        for event_id, fields in entries:
+            data = fields["data"]
+            if user.is_staff or json.loads(data)["user_creator"] == user.pk:
+                yield event_id, data
+        if len(entries) < REPLAY_PAGE_SIZE:
+            return
+        cursor = entries[-1][0]
+
+
+async def stream_events(user, last_event_id=None):
+    channel = STAFF_CHANNEL if user.is_staff else user_channel(user.pk)
+    # Subscribe before replaying so nothing published in between is lost.
+    queue = event_hub.subscribe(channel)
+    try:
+        yield "retry: 3000\n\n"
+        if last_event_id:
+            async for event_id, data in replay_events(user, last_event_id):
+                last_event_id = event_id
+                yield format_event(event_id, data)
+
+        while not queue.closed:
+            try:
+                message = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            message = json.loads(message)
+            if last_event_id and not is_newer(message["id"], last_event_id):
+                continue
+            last_event_id = message["id"]
+            yield format_event(message["id"], message["data"])
+    finally:
+        event_hub.unsubscribe(channel, queue)
+
+
+def parse_event_id(value):
+    if not value or not EVENT_ID_RE.match(value):
+        return None
+    millis, seq = value.split("-")
+    return int(millis), int(seq)
+
+
+def is_newer(event_id, other_id):
+    return parse_event_id(event_id) > parse_event_id(other_id)
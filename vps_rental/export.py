@@ -0,0 +1,132 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Application, ApplicationStatus
+
+EXPORT_COLUMNS = [
+    "application_id",
+    "status",
+    "created_at",
+    "updated_at",
+    "user_creator_id",
+    "user_moderator_id",
+    "service_id",
+    "service_name",
+    "unit_price",
+    "quantity",
+]
+
+# Applications without lines come out once, with empty service columns.
+EXPORT_FIELDS = [
+    "id",
+    "status",
+    "created_at",
+    "updated_at",
+    "user_creator_id",
+    "user_moderator_id",
+    "services__service_id",
+    "services__service__name",
+    # Lines are priced at formation; drafts fall back to the current price.
+    Coalesce(F("services__unit_price"), F("services__service__price")),
+    "services__quantity",
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_bound(value, name, end_of_day=False):
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        day = parse_date(value) if parsed is None else None
+    except ValueError:
+        # Well formed but impossible, e.g. 2024-02-30.
+        raise ExportError(f"Invalid {name}: not a valid date")
+    if parsed is None:
+        if day is None:
+            raise ExportError(f"Invalid {name}: expected ISO date or datetime")
+        if end_of_day:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_rows(statuses=None, created_from=None, created_to=None):
+    applications = Application.objects.all()
+
+    if statuses:
+        unknown = set(statuses) - set(ApplicationStatus.values)
+        if unknown:
+            raise ExportError(f"Unknown status: {', '.join(sorted(unknown))}")
+        applications = applications.filter(status__in=statuses)
+
+    created_from = parse_bound(created_from, "created_from")
+    if created_from:
+        applications = applications.filter(created_at__gte=created_from)
+
+    # A bare date as the upper bound includes that whole day.
+    created_to = parse_bound(created_to, "created_to", end_of_day=True)
+    if created_to:
+        applications = applications.filter(created_at__lt=created_to)
+
+    # values_list over the reverse relation is a LEFT OUTER JOIN.
+    return (
+        applications.order_by("id", "services__id")
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(output, rows):
+    if output == "ndjson":
+        return iter_ndjson(rows)
+    return iter_csv(rows)
+
+
+async def aiter_export(lines):
+    """
+    Async view of ``iter_export`` for ASGI. Django reads a sync iterator
+    there with ``sync_to_async(list)``, buffering the whole export, so each
+    chunk is fetched in the sync thread instead.
+    """
+    fetch = sync_to_async(lambda: "".join(islice(lines, EXPORT_CHUNK_SIZE)))
+    while chunk := await fetch():
+        yield chunk
@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+import uuid
+
+import redis
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .utils import redis_client, release_lock
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+RESULT_KEY = "idempotency:{scope}:{key}"
+LOCK_KEY = "idempotency:{scope}:{key}:lock"
+POLL_INTERVAL = 0.05
+FINGERPRINT_SALT = "vps_rental.idempotency.fingerprint"
+
+
+def file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return f"{upload.name}:{upload.size}:{digest.hexdigest()}"
+
+
+def canonical(value):
+    if isinstance(value, UploadedFile):
+        return file_digest(value)
+    return value
+
+
+def fingerprint(data):
+    """
+    Keyed with SECRET_KEY, so a stored fingerprint of a payload holding a
+    password cannot be brute-forced offline. Uploads count by content.
+    """
+    if hasattr(data, "lists"):
+        data = {
+            key: [canonical(value) for value in values] for key, values in data.lists()
+        }
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return salted_hmac(FINGERPRINT_SALT, payload, algorithm="sha256").hexdigest()
+
+
+def caller_scope(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    # Anonymous callers must not share keys with each other.
+    if request.session.session_key:
+        return f"session:{request.session.session_key}"
+    return f"client:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def replay(stored, request_fingerprint):
+    if stored["fingerprint"] != request_fingerprint:
+        return Response(
+            {
+                "status": "error",
+                "detail": "Idempotency-Key was already used with a different payload",
+            },
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored["data"], status=stored["status"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def store(result_key, request_fingerprint, response):
+    stored = {
+        "fingerprint": request_fingerprint,
+        "status": response.status_code,
+        "data": response.data,
+    }
+    try:
+        redis_client.set(
+            result_key,
+            json.dumps(stored, cls=JSONEncoder),
+            ex=settings.IDEMPOTENCY_TTL,
+        )
+    except redis.RedisError:
+        logger.warning("Failed to store idempotent response for %s", result_key)
+
+
+def release(lock_key, token):
+    try:
+        release_lock(lock_key, token)
+    except redis.RedisError:
+        logger.warning("Failed to release %s", lock_key)
+
+
+def idempotent(method):
+    """
+    Replay the stored response for a repeated ``Idempotency-Key`` instead of
+    running the view again; concurrent duplicates wait on a short lock.
+    """
+
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"status": "error", "detail": "Idempotency-Key is too long"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        scope = f"{caller_scope(request)}:{request.method}:{request.path}"
+        result_key = RESULT_KEY.format(scope=scope, key=key)
+        lock_key = LOCK_KEY.format(scope=scope, key=key)
+        request_fingerprint = fingerprint(request.data)
+        token = uuid.uuid4().hex
+
+        try:
+            stored = redis_client.get(result_key)
+            if stored:
+                return replay(json.loads(stored), request_fingerprint)
+
+            if not redis_client.set(
+                lock_key, token, nx=True, ex=settings.IDEMPOTENCY_LOCK_TTL
+            ):
+                deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    stored = redis_client.get(result_key)
+                    if stored:
+                        return replay(json.loads(stored), request_fingerprint)
+                return Response(
+                    {
+                        "status": "error",
+                        "detail": "A request with this Idempotency-Key is in progress",
+                    },
+                    status=status.HTTP_409_CONFLICT,
+                )
+        except redis.RedisError:
+            logger.warning("Idempotency store unavailable, running %s", request.path)
+            return method(view, request, *args, **kwargs)
+
+        try:
+            response = method(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                store(result_key, request_fingerprint, response)
+            return response
+        finally:
+            release(lock_key, token)
+
+    return wrapper
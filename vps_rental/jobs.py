@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .utils import redis_blocking_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "jobs:queue"
+DELAYED_KEY = "jobs:delayed"
+DEAD_KEY = "jobs:dead"
+METRICS_KEY = "jobs:metrics:{name}"
+PERIODIC_KEY = "jobs:periodic:{name}"
+PROCESSING_KEY = "jobs:processing:{worker}"
+WORKER_KEY = "jobs:worker:{worker}"
+
+JOB_REGISTRY = {}
+
+
+def job(name=None, max_attempts=None):
+    def decorator(func):
+        job_name = name or func.__name__
+        func.job_name = job_name
+        func.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        func.delay = lambda **kwargs: enqueue(job_name, **kwargs)
+        JOB_REGISTRY[job_name] = func
+        return func
+
+    return decorator
+
+
+def build_payload(name, kwargs):
+    return json.dumps(
+        {
+            "id": uuid.uuid4().hex,
+            "name": name,
+            "kwargs": kwargs,
+            "attempts": 0,
+            "enqueued_at": time.time(),
+        }
+    )
+
+
+def enqueue(name, **kwargs):
+    payload = build_payload(name, kwargs)
+    transaction.on_commit(lambda: _push(name, payload))
+
+
+def _push(name, payload):
+    try:
+        redis_client.lpush(QUEUE_KEY, payload)
+    except redis.RedisError:
+        logger.exception("Failed to enqueue job %s", name)
+
+
+def backoff_delay(attempts):
+    delay = min(
+        settings.JOBS_BACKOFF_BASE * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def job_metrics():
+    metrics = {}
+    for name in sorted(JOB_REGISTRY):
+        metrics[name] = redis_client.hgetall(METRICS_KEY.format(name=name))
+    metrics["_queue"] = {
+        "queued": redis_client.llen(QUEUE_KEY),
+        "delayed": redis_client.zcard(DELAYED_KEY),
+        "dead": redis_client.llen(DEAD_KEY),
+    }
+    return metrics
+
+
+class Worker:
+    """
+    Moves each job from the queue into its own processing list with BLMOVE
+    and removes it only once the job has succeeded, been rescheduled or
+    been buried. If a worker dies mid-job its heartbeat expires and another
+    worker puts the job back on the queue, so delivery is at-least-once.
+    """
+
+    recover_interval = 60
+    max_error_backoff = 30
+
+    def __init__(self, poll_timeout=5):
+        self.poll_timeout = poll_timeout
+        self.stopped = False
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.processing_key = PROCESSING_KEY.format(worker=self.worker_id)
+        self.heartbeat_key = WORKER_KEY.format(worker=self.worker_id)
+        self.recovered_at = 0.0
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run(self, burst=False):
+        threading.Thread(
+            target=self.heartbeat, name="job-worker-heartbeat", daemon=True
+        ).start()
+        failures = 0
+        while not self.stopped:
+            try:
+                if failures:
+                    # Jobs taken before the error are still in our list.
+                    self.requeue(self.processing_key)
+                if self.step(burst):
+                    return
+                failures = 0
+            except redis.RedisError as e:
+                failures += 1
+                delay = min(2**failures, self.max_error_backoff)
+                logger.warning("Job worker Redis error (%s), retrying in %ss", e, delay)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def step(self, burst):
+        """Run one poll cycle; returns True when a burst run is done."""
+        self.schedule_periodic()
+        self.promote_due()
+        self.recover_orphans()
+        payload = redis_blocking_client.blmove(
+            QUEUE_KEY, self.processing_key, self.poll_timeout, "RIGHT", "LEFT"
+        )
+        if payload is None:
+            return burst and not redis_client.zcard(DELAYED_KEY)
+        self.process(payload)
+        return False
+
+    def heartbeat(self):
+        ttl = settings.JOBS_WORKER_TTL
+        while not self.stopped:
+            try:
+                redis_client.set(self.heartbeat_key, 1, ex=ttl)
+            except redis.RedisError:
+                logger.warning("Job worker heartbeat failed")
+            time.sleep(ttl / 3)
+
+    def recover_orphans(self):
+        if time.monotonic() - self.recovered_at < self.recover_interval:
+            return
+        self.recovered_at = time.monotonic()
+        for key in redis_client.scan_iter(PROCESSING_KEY.format(worker="*")):
+            worker_id = key.rsplit(":", 1)[-1]
+            if key != self.processing_key and not redis_client.exists(
+                WORKER_KEY.format(worker=worker_id)
+            ):
+                moved = self.requeue(key)
+                if moved:
+                    logger.warning("Recovered %s jobs from dead worker %s", moved, key)
+
+    def requeue(self, key):
+        # Back to the consuming end of the queue, ahead of newer jobs.
+        moved = 0
+        while redis_client.lmove(key, QUEUE_KEY, "RIGHT", "RIGHT") is not None:
+            moved += 1
+        return moved
+
+    def schedule_periodic(self):
+        for name, interval in settings.JOBS_PERIODIC.items():
+            # The marker key expires after one interval, so exactly one
+            # worker across the fleet enqueues each run.
+            marker = PERIODIC_KEY.format(name=name)
+            if redis_client.set(marker, 1, nx=True, ex=interval):
+                redis_client.lpush(QUEUE_KEY, build_payload(name, {}))
+
+    def promote_due(self):
+        due = redis_client.zrangebyscore(DELAYED_KEY, "-inf", time.time(), 0, 100)
+        for payload in due:
+            # Only the worker that wins the ZREM requeues the job.
+            if redis_client.zrem(DELAYED_KEY, payload):
+                redis_client.lpush(QUEUE_KEY, payload)
+
+    def process(self, payload):
+        data = json.loads(payload)
+        name = data["name"]
+        metrics_key = METRICS_KEY.format(name=name)
+        func = JOB_REGISTRY.get(name)
+
+        if func is None:
+            logger.error("Unknown job %s", name)
+            self.bury(payload, data, "Unknown job")
+            return
+
+        started = time.monotonic()
+        # Jobs run outside the request cycle, so drop connections that
+        # timed out or broke between jobs ourselves.
+        close_old_connections()
+        try:
+            func(**data["kwargs"])
+        except Exception as e:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            data["attempts"] += 1
+            data["error"] = repr(e)
+
+            if data["attempts"] >= func.max_attempts:
+                logger.exception("Job %s %s moved to dead letters", name, data["id"])
+                self.bury(payload, data, repr(e))
+            else:
+                logger.warning(
+                    "Job %s %s failed (attempt %s), retrying",
+                    name,
+                    data["id"],
+                    data["attempts"],
+                )
+                run_at = time.time() + backoff_delay(data["attempts"])
+                pipe = redis_client.pipeline()
+                pipe.zadd(DELAYED_KEY, {json.dumps(data): run_at})
+                pipe.lrem(self.processing_key, 1, payload)
+                pipe.hincrby(metrics_key, "retried", 1)
+                pipe.execute()
+
+            pipe = redis_client.pipeline()
+            pipe.hincrby(metrics_key, "failed", 1)
+            pipe.hincrbyfloat(metrics_key, "duration_ms_total", elapsed_ms)
+            pipe.execute()
+            return
+        finally:
+            close_old_connections()
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        pipe = redis_client.pipeline()
+        pipe.lrem(self.processing_key, 1, payload)
+        pipe.hincrby(metrics_key, "succeeded", 1)
+        pipe.hincrbyfloat(metrics_key, "duration_ms_total", elapsed_ms)
+        pipe.hset(metrics_key, "last_duration_ms", round(elapsed_ms, 3))
+        pipe.hset(metrics_key, "queue_latency_ms", self.latency_ms(data))
+        pipe.execute()
+
+    def latency_ms(self, data):
+        return round((time.time() - data["enqueued_at"]) * 1000, 3)
+
+    def bury(self, payload, data, error):
+        data["error"] = error
+        data["buried_at"] = time.time()
+        pipe = redis_client.pipeline()
+        pipe.lpush(DEAD_KEY, json.dumps(data))
+        pipe.lrem(self.processing_key, 1, payload)
+        pipe.hincrby(METRICS_KEY.format(name=data["name"]), "dead", 1)
+        pipe.execute()
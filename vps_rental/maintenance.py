@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (Application, ApplicationService, ApplicationStatus,
+                     ArchivedApplication, ArchivedApplicationService)
+
+TERMINAL_STATUSES = [
+    ApplicationStatus.COMPLETED,
+    ApplicationStatus.REJECTED,
+    ApplicationStatus.DELETED,
+]
+
+
+def purge_stale_drafts(older_than_days, batch_size=500, pause=0.5, max_batches=None):
+    """Delete drafts untouched for ``older_than_days`` in short batches."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    stale = Application.objects.filter(
+        status=ApplicationStatus.DRAFT, updated_at__lt=cutoff
+    )
+    reclaimed = {"applications": 0, "services": 0, "batches": 0}
+
+    while max_batches is None or reclaimed["batches"] < max_batches:
+        with transaction.atomic():
+            # Drafts being edited right now are skipped, not waited on.
+            ids = list(
+                stale.select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Re-check staleness in the DELETE itself, so a draft touched
+            # after it was selected survives.
+            locked = stale.filter(id__in=ids)
+            services, _ = ApplicationService.objects.filter(
+                application__in=locked
+            ).delete()
+            applications, _ = locked.delete()
+
+        reclaimed["applications"] += applications
+        reclaimed["services"] += services
+        reclaimed["batches"] += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    return reclaimed
+
+
+def archive_terminal_applications(
+    older_than_days, batch_size=500, pause=0.5, max_batches=None
+):
+    """Move finished applications and their services to the archive tables."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    finished = Application.objects.filter(
+        status__in=TERMINAL_STATUSES, updated_at__lt=cutoff
+    )
+    moved = {"applications": 0, "services": 0, "batches": 0}
+
+    while max_batches is None or moved["batches"] < max_batches:
+        with transaction.atomic():
+            applications = list(
+                finished.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+            )
+            if not applications:
+                break
+            ids = [application.pk for application in applications]
+            lines = list(ApplicationService.objects.filter(application_id__in=ids))
+
+            ArchivedApplication.objects.bulk_create(
+                [
+                    ArchivedApplication(
+                        id=application.pk,
+                        status=application.status,
+                        created_at=application.created_at,
+                        updated_at=application.updated_at,
+                        user_creator_id=application.user_creator_id,
+                        user_moderator_id=application.user_moderator_id,
+                        total_price=application.total_price,
+                    )
+                    for application in applications
+                ]
+            )
+            ArchivedApplicationService.objects.bulk_create(
+                [
+                    ArchivedApplicationService(
+                        id=line.pk,
+                        application_id=line.application_id,
+                        service_id=line.service_id,
+                        unit_price=line.unit_price,
+                        quantity=line.quantity,
+                    )
+                    for line in lines
+                ]
+            )
+            ApplicationService.objects.filter(application_id__in=ids).delete()
+            Application.objects.filter(id__in=ids).delete()
+
+        moved["applications"] += len(applications)
+        moved["services"] += len(lines)
+        moved["batches"] += 1
+        if len(applications) < batch_size:
+            break
+        time.sleep(pause)
+
+    return moved
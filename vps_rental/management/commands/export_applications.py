@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vps_rental.export import (EXPORT_FORMATS, ExportError, export_rows,
+                               iter_export)
+
+
+class Command(BaseCommand):
+    help = "Stream applications with their services to CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-format", choices=list(EXPORT_FORMATS), default="csv"
+        )
+        parser.add_argument(
+            "--status",
+            action="append",
+            default=[],
+            help="Application status to include (repeatable)",
+        )
+        parser.add_argument("--created-from", help="ISO date or datetime")
+        parser.add_argument("--created-to", help="ISO date or datetime")
+        parser.add_argument("--file", help="Write to this path instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            rows = export_rows(
+                statuses=options["status"],
+                created_from=options["created_from"],
+                created_to=options["created_to"],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        chunks = iter_export(options["output_format"], rows)
+        if options["file"]:
+            with open(options["file"], "w", newline="", encoding="utf-8") as out:
+                out.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
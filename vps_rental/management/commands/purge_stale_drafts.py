@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vps_rental.maintenance import purge_stale_drafts
+
+
+class Command(BaseCommand):
+    help = "Delete draft applications that have not been touched for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=settings.DRAFT_TTL_DAYS
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.5,
+            help="Seconds to sleep between batches",
+        )
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        reclaimed = purge_stale_drafts(
+            options["older_than_days"],
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Removed {applications} drafts and {services} draft services "
+                "in {batches} batches".format(**reclaimed)
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from vps_rental import autocomplete
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis prefix index used for service autocomplete"
+
+    def handle(self, *args, **options):
+        autocomplete.rebuild()
+        self.stdout.write(self.style.SUCCESS("Autocomplete index rebuilt"))
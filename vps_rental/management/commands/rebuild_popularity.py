@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vps_rental import popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute the popular services ranking in Redis from Postgres"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=popularity.WINDOWS["week"])
+
+    def handle(self, *args, **options):
+        popularity.rebuild(days=options["days"])
+        self.stdout.write(self.style.SUCCESS("Popularity ranking rebuilt"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from vps_rental import capacity
+
+
+class Command(BaseCommand):
+    help = "Recompute the Redis capacity counters from Postgres"
+
+    def handle(self, *args, **options):
+        services = capacity.reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f"Capacity reconciled for {services} services")
+        )
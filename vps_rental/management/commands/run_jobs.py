@@ -0,0 +1,26 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from vps_rental import tasks  # noqa: F401
+from vps_rental.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Run the background job worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue and retry schedule are empty",
+        )
+        parser.add_argument("--poll-timeout", type=int, default=5)
+
+    def handle(self, *args, **options):
+        worker = Worker(poll_timeout=options["poll_timeout"])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write("Job worker started")
+        worker.run(burst=options["burst"])
+        self.stdout.write("Job worker stopped")
@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from vps_rental.models import ApplicationStatus
+from vps_rental.seeding import (DatasetGenerator, SeedError, parse_tiers,
+                                parse_weights, seed_redis,
+                                upload_placeholder_image)
+
+
+class Command(BaseCommand):
+    help = "Bulk-load a deterministic synthetic dataset with COPY for scale testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--staff", type=int, default=10)
+        parser.add_argument("--services", type=int, default=2_000)
+        parser.add_argument("--applications", type=int, default=1_000_000)
+        parser.add_argument("--max-services-per-application", type=int, default=5)
+        parser.add_argument(
+            "--days", type=int, default=365, help="Spread creation dates over N days"
+        )
+        parser.add_argument(
+            "--statuses",
+            help="Status weights, e.g. DRAFT=0.05,FORMED=0.15,COMPLETED=0.8",
+        )
+        parser.add_argument(
+            "--tiers",
+            help="User tiers as name=share:activity, e.g. heavy=0.05:20,light=0.95:1",
+        )
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument(
+            "--with-redis",
+            action="store_true",
+            help="Rebuild popularity, autocomplete and capacity counters afterwards",
+        )
+        parser.add_argument(
+            "--with-images",
+            action="store_true",
+            help="Upload a placeholder image to MinIO and attach it to services",
+        )
+        parser.add_argument(
+            "--password",
+            help="Password for every seeded user; unusable unless given",
+        )
+        parser.add_argument(
+            "--now",
+            help="Fixed ISO 8601 time to count timestamps back from",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            statuses = options["statuses"] and parse_weights(
+                options["statuses"], ApplicationStatus.values
+            )
+            tiers = options["tiers"] and parse_tiers(options["tiers"])
+        except SeedError as e:
+            raise CommandError(str(e))
+
+        now = None
+        if options["now"]:
+            try:
+                now = parse_datetime(options["now"])
+            except ValueError:
+                pass
+            if now is None:
+                raise CommandError(f"Invalid --now value '{options['now']}'")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now)
+
+        if options["with_images"]:
+            upload_placeholder_image()
+
+        generator = DatasetGenerator(
+            seed=options["seed"],
+            users=options["users"],
+            services=options["services"],
+            applications=options["applications"],
+            max_services_per_application=options["max_services_per_application"],
+            staff=options["staff"],
+            days=options["days"],
+            statuses=statuses,
+            tiers=tiers,
+            batch_size=options["batch_size"],
+            with_images=options["with_images"],
+            password=options["password"],
+            now=now,
+        )
+        counts = generator.run()
+
+        if options["with_redis"]:
+            seed_redis()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Loaded {users} users, {services} services, {applications} "
+                "applications and {application_services} application services".format(
+                    **counts
+                )
+            )
+        )
@@ -0,0 +1,301 @@
+import cProfile
+import io
+import json
+import logging
+import mimetypes
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from collections import Counter
+
+import redis
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+from .compression import compress, is_compressible, negotiate
+from .storage import ENCODING_SUFFIXES
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = "profiles:{id}"
+PROFILE_INDEX_KEY = "profiles:index"
+PROFILE_HEADER = "X-Profile"
+PROFILE_STATS_LIMIT = 60
+# Queries on these routes carry credentials, so they are never captured.
+PROFILE_EXCLUDED_ROUTES = {"register", "login", "logout", "user"}
+
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryRecorder:
+    """
+    Records SQL with literals masked. Parameters may hold password hashes or
+    session data, so they are only compared in memory to find duplicates and
+    never stored.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.exact = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            shape = SQL_LITERAL_RE.sub("?", sql)
+            self.exact[(shape, sql, repr(params))] += 1
+            self.queries.append(
+                {
+                    "sql": shape,
+                    "many": many,
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+    def summary(self):
+        shapes = Counter(query["sql"] for query in self.queries)
+        return {
+            "count": len(self.queries),
+            "total_ms": round(sum(query["ms"] for query in self.queries), 3),
+            "duplicates": [
+                {"sql": shape, "count": count}
+                for (shape, _, _), count in self.exact.items()
+                if count > 1
+            ],
+            "similar": [
+                {"sql": shape, "count": count}
+                for shape, count in shapes.most_common()
+                if count > 1
+            ],
+            "queries": self.queries,
+        }
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StaticFile:
+    def __init__(self, path, hashed):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL
+            if hashed
+            else f"public, max-age={settings.STATIC_MAX_AGE}"
+        )
+        self.variants = {
+            encoding: path + suffix
+            for encoding, suffix in ENCODING_SUFFIXES.items()
+            if os.path.isfile(path + suffix)
+        }
+
+    def response(self, request):
+        encoding = None
+        if self.variants:
+            encoding = negotiate(
+                request.META.get("HTTP_ACCEPT_ENCODING", ""), list(self.variants)
+            )
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+        else:
+            # FileResponse hands the file to wsgi.file_wrapper (sendfile).
+            response = FileResponse(
+                open(self.variants.get(encoding, self.path), "rb"),
+                content_type=self.content_type,
+            )
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Last-Modified"] = self.last_modified
+        response["Cache-Control"] = self.cache_control
+        if self.variants:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serves collected files from STATIC_ROOT in-process. The index is built
+    once at startup; names listed in the staticfiles manifest are content
+    hashed and cached by browsers forever, the rest briefly.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.files = self.scan(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            static_file = self.files.get(request.path[len(self.prefix) :])
+            if static_file is not None:
+                return static_file.response(request)
+        return self.get_response(request)
+
+    def scan(self, root):
+        if not root or not os.path.isdir(root):
+            return {}
+
+        hashed = set()
+        manifest = os.path.join(root, "staticfiles.json")
+        if os.path.isfile(manifest):
+            with open(manifest, encoding="utf-8") as f:
+                hashed = set(json.load(f).get("paths", {}).values())
+
+        suffixes = tuple(ENCODING_SUFFIXES.values())
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith(suffixes) and os.path.isfile(path[:-3]):
+                    continue
+                url = os.path.relpath(path, root).replace(os.sep, "/")
+                files[url] = StaticFile(path, url in hashed)
+        return files
+
+
+class CompressionMiddleware:
+    """
+    Compresses eligible responses with brotli or gzip according to
+    Accept-Encoding. Responses that already carry a Content-Encoding, such
+    as precompressed cache hits, pass through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(response.content))
+        response["Content-Encoding"] = encoding
+        # The body is no longer byte-for-byte what a strong ETag promised.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when a staff user sends ``X-Profile: 1`` or when it
+    falls into the PROFILING_SAMPLE_RATE sample, except on the auth routes.
+    Other requests only pay for the trigger check.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        profile_id = self.store(request, response, profiler, recorder, elapsed_ms)
+        if profile_id:
+            response["X-Profile-Id"] = profile_id
+        return response
+
+    def should_profile(self, request):
+        if request.headers.get(PROFILE_HEADER) == "1":
+            wanted = request.user.is_staff
+        else:
+            rate = settings.PROFILING_SAMPLE_RATE
+            wanted = rate > 0 and random.random() < rate
+        return wanted and not self.is_excluded(request)
+
+    def is_excluded(self, request):
+        try:
+            return resolve(request.path_info).url_name in PROFILE_EXCLUDED_ROUTES
+        except Resolver404:
+            return False
+
+    def store(self, request, response, profiler, recorder, elapsed_ms):
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(PROFILE_STATS_LIMIT)
+
+        profile_id = uuid.uuid4().hex
+        capture = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "user": request.user.pk,
+            "status": response.status_code,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "at": time.time(),
+            "sql": recorder.summary(),
+            "profile": stream.getvalue(),
+        }
+        summary = {
+            key: capture[key]
+            for key in ("id", "method", "path", "status", "elapsed_ms", "at")
+        }
+        summary["queries"] = capture["sql"]["count"]
+
+        ttl = settings.PROFILING_TTL
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(PROFILE_KEY.format(id=profile_id), json.dumps(capture), ex=ttl)
+            pipe.lpush(PROFILE_INDEX_KEY, json.dumps(summary))
+            pipe.ltrim(PROFILE_INDEX_KEY, 0, settings.PROFILING_KEEP - 1)
+            pipe.expire(PROFILE_INDEX_KEY, ttl)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Failed to store profile for %s", request.path)
+            return None
+        return profile_id
+
+
+def recent_profiles():
+    entries = [
+        json.loads(entry) for entry in redis_client.lrange(PROFILE_INDEX_KEY, 0, -1)
+    ]
+    if not entries:
+        return []
+    pipe = redis_client.pipeline()
+    for entry in entries:
+        pipe.exists(PROFILE_KEY.format(id=entry["id"]))
+    return [entry for entry, alive in zip(entries, pipe.execute()) if alive]
+
+
+def load_profile(profile_id):
+    raw = redis_client.get(PROFILE_KEY.format(id=profile_id))
+    return json.loads(raw) if raw else None
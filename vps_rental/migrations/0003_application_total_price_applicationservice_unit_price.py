@@ -0,0 +1,68 @@
+# Generated by Django 5.2.2 on 2026-10-19 10:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def snapshot_existing_prices(apps, schema_editor):
+    Application = apps.get_model("vps_rental", "Application")
+    ApplicationService = apps.get_model("vps_rental", "ApplicationService")
+    Service = apps.get_model("vps_rental", "Service")
+
+    ApplicationService.objects.exclude(application__status="DRAFT").update(
+        unit_price=Subquery(
+            Service.objects.filter(pk=OuterRef("service_id")).values("price")[:1]
+        )
+    )
+    total = (
+        ApplicationService.objects.filter(application=OuterRef("pk"))
+        .values("application")
+        .annotate(total=Sum(F("unit_price") * F("quantity")))
+        .values("total")
+    )
+    Application.objects.exclude(status="DRAFT").update(
+        total_price=Coalesce(
+            Subquery(total),
+            Value(Decimal("0")),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0002_alter_service_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="total_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=12, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="applicationservice",
+            name="quantity",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="applicationservice",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["status", "total_price"], name="application_status_total"
+            ),
+        ),
+        migrations.RunPython(snapshot_existing_prices, migrations.RunPython.noop),
+    ]
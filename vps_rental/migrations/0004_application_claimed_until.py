@@ -0,0 +1,26 @@
+# Generated by Django 5.2.2 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0003_application_total_price_applicationservice_unit_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                condition=models.Q(("status", "FORMED")),
+                fields=["created_at"],
+                name="application_formed_queue",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0004_application_claimed_until"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["user_creator", "updated_at", "id"],
+                name="application_user_sync",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.2 on 2026-10-19 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def merge_duplicate_drafts(apps, schema_editor):
+    Application = apps.get_model("vps_rental", "Application")
+    ApplicationService = apps.get_model("vps_rental", "ApplicationService")
+
+    duplicated = (
+        Application.objects.filter(status="DRAFT")
+        .values("user_creator")
+        .annotate(drafts=Count("id"), keep=Max("id"))
+        .filter(drafts__gt=1)
+    )
+    for row in duplicated:
+        extra = Application.objects.filter(
+            user_creator=row["user_creator"], status="DRAFT"
+        ).exclude(pk=row["keep"])
+        kept_services = ApplicationService.objects.filter(
+            application_id=row["keep"]
+        ).values("service_id")
+        for draft in extra:
+            ApplicationService.objects.filter(application=draft).exclude(
+                service_id__in=kept_services
+            ).update(application_id=row["keep"])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0005_application_user_sync"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_drafts, migrations.RunPython.noop),
+        # The merge leaves deferred FK checks pending, and Postgres refuses to
+        # build an index on a table with pending trigger events in the same
+        # transaction. Fire them now.
+        migrations.RunSQL(
+            "SET CONSTRAINTS ALL IMMEDIATE", reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.AddConstraint(
+            model_name="application",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "DRAFT")),
+                fields=("user_creator",),
+                name="application_single_draft",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                condition=models.Q(("status__in", ["DRAFT", "DELETED"]), _negated=True),
+                fields=["user_creator", "created_at"],
+                name="application_live",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["id"],
+                name="service_active",
+            ),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0006_draft_and_active_partial_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedApplication",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("DRAFT", "Draft"),
+                            ("DELETED", "Deleted"),
+                            ("FORMED", "Formed"),
+                            ("COMPLETED", "Completed"),
+                            ("REJECTED", "Rejected"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "total_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=12, null=True
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user_creator",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="archived_applications",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user_moderator",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="archived_moderated_applications",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивная заявка",
+                "verbose_name_plural": "Архивные заявки",
+                "ordering": ["created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user_creator", "created_at"],
+                        name="archived_application_user",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedApplicationService",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "unit_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=1)),
+                (
+                    "application",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="services",
+                        to="vps_rental.archivedapplication",
+                    ),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_applications",
+                        to="vps_rental.service",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Услуга в архивной заявке",
+                "verbose_name_plural": "Услуги в архивных заявках",
+            },
+        ),
+    ]
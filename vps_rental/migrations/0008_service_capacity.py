@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0007_archivedapplication_archivedapplicationservice"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="capacity",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.2 on 2026-10-19 16:00
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0008_service_capacity"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper(
+                        django.db.models.functions.comparison.Cast(
+                            "name", output_field=models.TextField()
+                        )
+                    ),
+                    name="text_pattern_ops",
+                ),
+                name="service_name_prefix",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(fields=["created_at"], name="application_created"),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["status", "created_at"], name="application_status_created"
+            ),
+        ),
+    ]
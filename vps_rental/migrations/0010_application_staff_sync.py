@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0009_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                condition=models.Q(("status", "DRAFT"), _negated=True),
+                fields=["updated_at", "id"],
+                name="application_staff_sync",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-19 18:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vps_rental", "0010_application_staff_sync"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="application",
+            name="application_formed_queue",
+        ),
+    ]
@@ -1,5 +1,11 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Upper
+from django.utils import timezone
 from django_minio_backend import MinioBackend
 
 
@@ -19,6 +25,8 @@ class Service(models.Model):
     ram = models.CharField(max_length=100)
     disk = models.CharField(max_length=100)
     internet_speed = models.CharField(max_length=100)
+    # Number of units that may be rented at once; empty means unlimited.
+    capacity = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -27,6 +35,19 @@ class Service(models.Model):
         ordering = ["id"]
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
+        indexes = [
+            models.Index(
+                fields=["id"], condition=Q(is_active=True), name="service_active"
+            ),
+            # Serves case-insensitive prefix search (istartswith) on the name.
+            models.Index(
+                OpClass(
+                    Upper(Cast("name", output_field=models.TextField())),
+                    name="text_pattern_ops",
+                ),
+                name="service_name_prefix",
+            ),
+        ]
 
 
 class ApplicationStatus(models.TextChoices):
@@ -37,6 +58,24 @@ class ApplicationStatus(models.TextChoices):
     REJECTED = "REJECTED"
 
 
+APPLICATION_TRANSITIONS = {
+    ApplicationStatus.FORMED: {ApplicationStatus.DRAFT},
+    ApplicationStatus.COMPLETED: {ApplicationStatus.FORMED},
+    ApplicationStatus.REJECTED: {ApplicationStatus.FORMED},
+    # Any live application can be deleted, as before the state machine.
+    ApplicationStatus.DELETED: {
+        ApplicationStatus.DRAFT,
+        ApplicationStatus.FORMED,
+        ApplicationStatus.COMPLETED,
+        ApplicationStatus.REJECTED,
+    },
+}
+
+
+class TransitionConflict(Exception):
+    pass
+
+
 class Application(models.Model):
     status = models.CharField(
         max_length=20,
@@ -59,13 +98,117 @@ class Application(models.Model):
         related_name="moderated_applications",
     )
 
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    total_price = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+
     def __str__(self):
         return f"Заявка № {self.id}"
 
+    @classmethod
+    def claim_next(cls, moderator, limit, lease):
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(status=ApplicationStatus.FORMED)
+                .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+                .order_by("created_at")
+                .values_list("pk", flat=True)[:limit]
+            )
+            cls.objects.filter(pk__in=ids).update(
+                user_moderator=moderator,
+                claimed_until=now + lease,
+                updated_at=now,
+            )
+        return cls.objects.filter(pk__in=ids).order_by("created_at")
+
+    def transition_to(self, new_status, condition=None, **changes):
+        """
+        Compare-and-set the status without taking a row lock.
+
+        Raises TransitionConflict if the transition is not allowed from the
+        current status or if the row changed since it was read.
+        """
+        previous_status = self.status
+        if previous_status not in APPLICATION_TRANSITIONS.get(new_status, ()):
+            raise TransitionConflict(
+                f"Cannot change status from '{previous_status}' to '{new_status}'"
+            )
+
+        changes["updated_at"] = timezone.now()
+        rows = Application.objects.filter(pk=self.pk, status=previous_status)
+        if condition is not None:
+            rows = rows.filter(condition)
+        updated = rows.update(status=new_status, **changes)
+        if not updated:
+            raise TransitionConflict("The application was modified concurrently")
+
+        self.status = new_status
+        for field, value in changes.items():
+            setattr(self, field, value)
+        return previous_status
+
+    def snapshot_prices(self):
+        self.services.update(
+            unit_price=Subquery(
+                Service.objects.filter(pk=OuterRef("service_id")).values("price")[:1]
+            )
+        )
+        total = (
+            ApplicationService.objects.filter(application=OuterRef("pk"))
+            .values("application")
+            .annotate(total=Sum(F("unit_price") * F("quantity")))
+            .values("total")
+        )
+        Application.objects.filter(pk=self.pk).update(
+            total_price=Coalesce(
+                Subquery(total),
+                Value(Decimal("0")),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+        self.refresh_from_db(fields=["total_price"])
+
     class Meta:
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
         ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "total_price"], name="application_status_total"
+            ),
+            models.Index(fields=["created_at"], name="application_created"),
+            # Also serves the FORMED claim queue.
+            models.Index(
+                fields=["status", "created_at"], name="application_status_created"
+            ),
+            models.Index(
+                fields=["user_creator", "updated_at", "id"],
+                name="application_user_sync",
+            ),
+            # Staff delta sync scans every non-draft row by (updated_at, id).
+            models.Index(
+                fields=["updated_at", "id"],
+                condition=~Q(status=ApplicationStatus.DRAFT),
+                name="application_staff_sync",
+            ),
+            models.Index(
+                fields=["user_creator", "created_at"],
+                condition=~Q(
+                    status__in=[ApplicationStatus.DRAFT, ApplicationStatus.DELETED]
+                ),
+                name="application_live",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_creator"],
+                condition=Q(status=ApplicationStatus.DRAFT),
+                name="application_single_draft",
+            ),
+        ]
 
 
 class ApplicationService(models.Model):
@@ -75,6 +218,10 @@ class ApplicationService(models.Model):
     service = models.ForeignKey(
         Service, on_delete=models.CASCADE, related_name="applications"
     )
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    quantity = models.PositiveIntegerField(default=1)
 
     class Meta:
         unique_together = ("application", "service")
@@ -82,4 +229,62 @@ class ApplicationService(models.Model):
         verbose_name_plural = "Услуги в заявках"
 
     def __str__(self):
-        return f"Заявка {self.application.id} - Услуга {self.service.name}"
+        return f"Заявка {self.application_id} - Услуга {self.service.name}"
+
+
+class ArchivedApplication(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(max_length=20, choices=ApplicationStatus.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    user_creator = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        related_name="archived_applications",
+    )
+    user_moderator = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name="archived_moderated_applications",
+    )
+    total_price = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Архивная заявка № {self.id}"
+
+    class Meta:
+        verbose_name = "Архивная заявка"
+        verbose_name_plural = "Архивные заявки"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["user_creator", "created_at"],
+                name="archived_application_user",
+            ),
+        ]
+
+
+class ArchivedApplicationService(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    application = models.ForeignKey(
+        ArchivedApplication, on_delete=models.CASCADE, related_name="services"
+    )
+    service = models.ForeignKey(
+        Service, on_delete=models.CASCADE, related_name="archived_applications"
+    )
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Услуга в архивной заявке"
+        verbose_name_plural = "Услуги в архивных заявках"
+
+    def __str__(self):
+        return f"Архивная заявка {self.application_id} - Услуга {self.service_id}"
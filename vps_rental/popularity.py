@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+
+import redis
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ApplicationService, ApplicationStatus
+from .utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+DAY_KEY = "popular:services:day:{day}"
+WINDOW_KEY = "popular:services:{window}"
+WINDOWS = {"day": 1, "week": 7}
+DAILY_DECAY = 0.7
+WINDOW_CACHE_TTL = 60
+DAY_KEY_TTL = timedelta(days=8)
+
+ADD_WEIGHT = 1
+FORM_WEIGHT = 3
+
+FORMED_STATUSES = [
+    ApplicationStatus.FORMED,
+    ApplicationStatus.COMPLETED,
+    ApplicationStatus.REJECTED,
+]
+
+
+def day_key(day):
+    return DAY_KEY.format(day=day.strftime("%Y%m%d"))
+
+
+def record(service_ids, weight):
+    service_ids = list(service_ids)
+    transaction.on_commit(lambda: _increment(service_ids, weight))
+
+
+def _increment(service_ids, weight):
+    key = day_key(timezone.now().date())
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for service_id in service_ids:
+            pipe.zincrby(key, weight, service_id)
+        pipe.expire(key, DAY_KEY_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Failed to update popularity for %s", service_ids)
+
+
+def window_key(window):
+    key = WINDOW_KEY.format(window=window)
+    if not redis_client.exists(key):
+        today = timezone.now().date()
+        weights = {
+            day_key(today - timedelta(days=age)): DAILY_DECAY**age
+            for age in range(WINDOWS[window])
+        }
+        pipe = redis_client.pipeline()
+        pipe.zunionstore(key, weights)
+        pipe.expire(key, WINDOW_CACHE_TTL)
+        pipe.execute()
+    return key
+
+
+def top(window, limit=None):
+    """Return ``[(service_id, score), ...]``, most popular first."""
+    stop = -1 if limit is None else limit - 1
+    ranked = redis_client.zrevrange(window_key(window), 0, stop, withscores=True)
+    return [(int(service_id), score) for service_id, score in ranked]
+
+
+def rebuild(days=WINDOWS["week"]):
+    today = timezone.now().date()
+    since = today - timedelta(days=days - 1)
+    rows = (
+        ApplicationService.objects.filter(application__created_at__date__gte=since)
+        .annotate(day=TruncDate("application__created_at"))
+        .values("day", "service_id")
+        .annotate(
+            added=Count("id"),
+            formed=Count("id", filter=Q(application__status__in=FORMED_STATUSES)),
+        )
+    )
+
+    pipe = redis_client.pipeline()
+    for age in range(days):
+        pipe.delete(day_key(today - timedelta(days=age)))
+    for window in WINDOWS:
+        pipe.delete(WINDOW_KEY.format(window=window))
+    for row in rows.iterator():
+        key = day_key(row["day"])
+        score = row["added"] * ADD_WEIGHT + row["formed"] * FORM_WEIGHT
+        pipe.zincrby(key, score, row["service_id"])
+        pipe.expire(key, DAY_KEY_TTL)
+    pipe.execute()
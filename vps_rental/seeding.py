@@ -0,0 +1,366 @@
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import autocomplete, capacity, popularity
+from .models import Application, ApplicationService, ApplicationStatus, Service
+from .utils import minio_client
+
+PLACEHOLDER_KEY = "services/seed/placeholder.png"
+# 1x1 transparent PNG.
+PLACEHOLDER_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f"
+    "15c4890000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+)
+
+DEFAULT_STATUSES = {
+    ApplicationStatus.DRAFT: 0.05,
+    ApplicationStatus.FORMED: 0.15,
+    ApplicationStatus.COMPLETED: 0.55,
+    ApplicationStatus.REJECTED: 0.15,
+    ApplicationStatus.DELETED: 0.10,
+}
+# Share of users in the tier and how many applications each makes relative
+# to a light user.
+DEFAULT_TIERS = {"heavy": (0.05, 20), "regular": (0.25, 5), "light": (0.70, 1)}
+
+PROCESSORS = ["1 vCPU", "2 vCPU", "4 vCPU", "8 vCPU", "16 vCPU"]
+RAM = ["1 GB", "2 GB", "4 GB", "8 GB", "16 GB", "32 GB"]
+DISKS = ["20 GB SSD", "40 GB SSD", "80 GB NVMe", "160 GB NVMe", "320 GB NVMe"]
+SPEEDS = ["100 Mbit/s", "200 Mbit/s", "500 Mbit/s", "1 Gbit/s"]
+
+
+class SeedError(ValueError):
+    pass
+
+
+def parse_weights(value, choices):
+    """Parse ``NAME=weight,...`` into a dict, e.g. ``FORMED=0.2,DRAFT=0.1``."""
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in choices:
+            allowed = ", ".join(choices)
+            raise SeedError(f"Unknown value '{name}'. Allowed: {allowed}.")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise SeedError(f"Invalid weight for '{name}': '{weight}'")
+    return weights
+
+
+def parse_tiers(value):
+    """Parse ``tier=share:activity,...``, e.g. ``heavy=0.05:20,light=0.95:1``."""
+    tiers = {}
+    for item in value.split(","):
+        name, _, spec = item.partition("=")
+        try:
+            share, activity = (float(part) for part in spec.split(":"))
+        except ValueError:
+            raise SeedError(f"Invalid tier '{item}', expected name=share:activity")
+        tiers[name.strip()] = (share, activity)
+    return tiers
+
+
+def copy_value(value):
+    if value is None:
+        return r"\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(model, columns, rows):
+    """Load rows into the model's table with a single COPY."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ", ".join(connection.ops.quote_name(column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({names}) FROM STDIN", buffer)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+
+def reset_sequences():
+    sql = connection.ops.sequence_reset_sql(
+        no_style(), [User, Service, Application, ApplicationService]
+    )
+    with connection.cursor() as cursor:
+        for statement in sql:
+            cursor.execute(statement)
+
+
+class DatasetGenerator:
+    """
+    Produces a reproducible dataset. The same seed and options give the same
+    rows when loaded into an empty database with a fixed ``now``. IDs
+    continue after existing rows, and timestamps count back from ``now``,
+    which defaults to the moment of the load.
+
+    Seeded users get an unusable password unless one is passed explicitly.
+    """
+
+    def __init__(
+        self,
+        seed,
+        users,
+        services,
+        applications,
+        max_services_per_application=5,
+        staff=10,
+        days=365,
+        statuses=None,
+        tiers=None,
+        batch_size=50_000,
+        with_images=False,
+        password=None,
+        now=None,
+    ):
+        self.random = random.Random(seed)
+        self.users = users
+        self.services = services
+        self.applications = applications
+        self.max_services_per_application = max_services_per_application
+        self.staff = min(staff, users)
+        self.days = days
+        self.statuses = statuses or DEFAULT_STATUSES
+        self.tiers = tiers or DEFAULT_TIERS
+        self.batch_size = batch_size
+        self.with_images = with_images
+        # Hashing once keeps user generation fast; every seeded user shares it.
+        self.password = make_password(password)
+        self.now = now or timezone.now()
+
+    def run(self):
+        counts = {
+            "users": self.load_users(),
+            "services": self.load_services(),
+        }
+        counts.update(self.load_applications())
+        reset_sequences()
+        return counts
+
+    def load_users(self):
+        first_id = next_id(User)
+        self.user_ids = list(range(first_id, first_id + self.users))
+        self.staff_ids = self.user_ids[: self.staff]
+        self.customer_ids = self.user_ids[self.staff :] or self.user_ids
+        self.customer_weights = self.tier_weights(len(self.customer_ids))
+
+        columns = [
+            "id",
+            "password",
+            "is_superuser",
+            "username",
+            "first_name",
+            "last_name",
+            "email",
+            "is_staff",
+            "is_active",
+            "date_joined",
+        ]
+        for start in range(0, self.users, self.batch_size):
+            ids = self.user_ids[start : start + self.batch_size]
+            with transaction.atomic():
+                copy_rows(User, columns, (self.user_row(pk) for pk in ids))
+        return self.users
+
+    def user_row(self, pk):
+        is_staff = pk in self.staff_ids
+        prefix = "moderator" if is_staff else "user"
+        return [
+            pk,
+            self.password,
+            False,
+            f"seed_{prefix}_{pk}",
+            "",
+            "",
+            f"seed_{prefix}_{pk}@example.com",
+            is_staff,
+            True,
+            self.timestamp(),
+        ]
+
+    def tier_weights(self, count):
+        weights = []
+        for share, activity in self.tiers.values():
+            weights.extend([activity] * round(count * share))
+        weights.extend([1] * (count - len(weights)))
+        weights = weights[:count]
+        self.random.shuffle(weights)
+        return weights
+
+    def load_services(self):
+        first_id = next_id(Service)
+        columns = [
+            "id",
+            "name",
+            "image",
+            "mini_description",
+            "price",
+            "is_active",
+            "description",
+            "processor",
+            "ram",
+            "disk",
+            "internet_speed",
+            "capacity",
+        ]
+        self.service_ids = list(range(first_id, first_id + self.services))
+        self.service_prices = {}
+        rows = []
+        for pk in self.service_ids:
+            tier = self.random.randrange(len(PROCESSORS))
+            price = Decimal(self.random.randint(200, 900) * (tier + 1)).quantize(
+                Decimal("0.01")
+            )
+            self.service_prices[pk] = price
+            rows.append(
+                [
+                    pk,
+                    f"VPS {PROCESSORS[tier]} #{pk}",
+                    PLACEHOLDER_KEY if self.with_images else None,
+                    f"Тариф {pk}: {PROCESSORS[tier]}, {RAM[tier]}",
+                    price,
+                    self.random.random() < 0.9,
+                    f"Синтетический тариф {pk} для нагрузочного тестирования",
+                    PROCESSORS[tier],
+                    self.random.choice(RAM[tier:]),
+                    self.random.choice(DISKS),
+                    self.random.choice(SPEEDS),
+                    self.random.choice([None, None, self.random.randint(50, 5000)]),
+                ]
+            )
+        with transaction.atomic():
+            copy_rows(Service, columns, rows)
+        return self.services
+
+    def load_applications(self):
+        application_columns = [
+            "id",
+            "status",
+            "created_at",
+            "updated_at",
+            "user_creator_id",
+            "user_moderator_id",
+            "claimed_until",
+            "total_price",
+        ]
+        line_columns = [
+            "application_id",
+            "service_id",
+            "unit_price",
+            "quantity",
+        ]
+        statuses = list(self.statuses)
+        status_weights = [self.statuses[name] for name in statuses]
+        with_draft = {
+            pk
+            for pk in Application.objects.filter(
+                status=ApplicationStatus.DRAFT
+            ).values_list("user_creator_id", flat=True)
+        }
+
+        first_id = next_id(Application)
+        lines_total = 0
+        for start in range(0, self.applications, self.batch_size):
+            size = min(self.batch_size, self.applications - start)
+            creators = self.random.choices(
+                self.customer_ids, weights=self.customer_weights, k=size
+            )
+            picked = self.random.choices(statuses, weights=status_weights, k=size)
+            applications, lines = [], []
+            for offset, (creator, status) in enumerate(zip(creators, picked)):
+                # Only one draft per user is allowed.
+                if status == ApplicationStatus.DRAFT:
+                    if creator in with_draft:
+                        status = ApplicationStatus.DELETED
+                    else:
+                        with_draft.add(creator)
+                pk = first_id + start + offset
+                application, items = self.application_rows(pk, creator, status)
+                applications.append(application)
+                lines.extend(items)
+
+            with transaction.atomic():
+                copy_rows(Application, application_columns, applications)
+                copy_rows(ApplicationService, line_columns, lines)
+            lines_total += len(lines)
+        return {"applications": self.applications, "application_services": lines_total}
+
+    def application_rows(self, pk, creator, status):
+        created_at = self.timestamp()
+        updated_at = min(
+            created_at + timedelta(minutes=self.random.randint(0, 7 * 24 * 60)),
+            self.now,
+        )
+        snapshot = status not in (ApplicationStatus.DRAFT, ApplicationStatus.DELETED)
+        moderated = self.staff_ids and status in (
+            ApplicationStatus.COMPLETED,
+            ApplicationStatus.REJECTED,
+        )
+
+        count = self.random.randint(1, self.max_services_per_application)
+        service_ids = self.random.sample(
+            self.service_ids, min(count, len(self.service_ids))
+        )
+        lines, total = [], Decimal("0")
+        for service_id in service_ids:
+            quantity = self.random.choice([1, 1, 1, 2, 3])
+            price = self.service_prices[service_id]
+            total += price * quantity
+            lines.append([pk, service_id, price if snapshot else None, quantity])
+
+        application = [
+            pk,
+            status,
+            created_at,
+            updated_at,
+            creator,
+            self.random.choice(self.staff_ids) if moderated else None,
+            None,
+            total if snapshot else None,
+        ]
+        return application, lines
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 86400))
+
+
+def upload_placeholder_image():
+    bucket = settings.SERVICE_IMAGE_BUCKET
+    if not minio_client.bucket_exists(bucket):
+        minio_client.make_bucket(bucket)
+    minio_client.put_object(
+        bucket,
+        PLACEHOLDER_KEY,
+        io.BytesIO(PLACEHOLDER_PNG),
+        length=len(PLACEHOLDER_PNG),
+        content_type="image/png",
+    )
+
+
+def seed_redis():
+    popularity.rebuild()
+    autocomplete.rebuild()
+    capacity.reconcile()
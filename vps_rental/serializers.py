@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from .models import Application, Service
+from .models import Application, ArchivedApplication, Service
 
 
 class ServiceSerializer(serializers.ModelSerializer):
@@ -17,6 +17,16 @@ class ServiceSerializer(serializers.ModelSerializer):
         ]
 
 
+class ServiceListSerializer(ServiceSerializer):
+    available = serializers.SerializerMethodField()
+
+    class Meta(ServiceSerializer.Meta):
+        fields = ServiceSerializer.Meta.fields + ["capacity", "available"]
+
+    def get_available(self, obj):
+        return self.context.get("availability", {}).get(obj.pk)
+
+
 class ServiceDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
@@ -35,13 +45,37 @@ class ApplicationSerializer(serializers.ModelSerializer):
             "updated_at",
             "user_creator",
             "user_moderator",
+            "claimed_until",
+            "total_price",
             "services",
         ]
 
     def get_services(self, obj):
-        app_services = obj.services.all()
-        services = [app_service.service for app_service in app_services]
-        return ServiceSerializer(services, many=True).data
+        price_field = ServiceSerializer().fields["price"]
+        services = []
+        for app_service in obj.services.all():
+            item = ServiceSerializer(app_service.service).data
+            if app_service.unit_price is not None:
+                item["price"] = price_field.to_representation(app_service.unit_price)
+            item["quantity"] = app_service.quantity
+            services.append(item)
+        return services
+
+
+class ArchivedApplicationSerializer(ApplicationSerializer):
+    class Meta:
+        model = ArchivedApplication
+        fields = [
+            "pk",
+            "status",
+            "created_at",
+            "updated_at",
+            "user_creator",
+            "user_moderator",
+            "total_price",
+            "archived_at",
+            "services",
+        ]
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import reindex_service, unindex_service
+from .cache import service_cache
+from .capacity import reset_capacity
+from .compression import bump_version
+from .models import Service
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_service_cache(sender, instance, **kwargs):
+    # Bind the pk now: delete() clears it before on_commit callbacks run.
+    pk = instance.pk
+    transaction.on_commit(lambda: service_cache.invalidate(pk))
+    transaction.on_commit(lambda: bump_version("catalog"))
+
+
+@receiver(post_save, sender=Service)
+def update_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: reindex_service(instance))
+
+
+@receiver(post_delete, sender=Service)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: unindex_service(pk))
+
+
+@receiver(post_save, sender=Service)
+def reset_capacity_counter(sender, instance, **kwargs):
+    # The counter is rebuilt from the database on next use.
+    pk = instance.pk
+    transaction.on_commit(lambda: reset_capacity(pk))
@@ -0,0 +1,48 @@
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from .compression import available_encodings, compress
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes ``.br``/``.gz`` siblings for
+    compressible files, so they can be served without compressing per
+    request.
+    """
+
+    compressible_extensions = {
+        ".css",
+        ".js",
+        ".json",
+        ".map",
+        ".svg",
+        ".txt",
+        ".html",
+        ".xml",
+    }
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in paths:
+            if os.path.splitext(name)[1] not in self.compressible_extensions:
+                continue
+            for stored in {name, self.stored_name(name)}:
+                self.write_variants(stored)
+
+    def write_variants(self, name):
+        path = self.path(name)
+        with open(path, "rb") as source:
+            content = source.read()
+        for encoding in available_encodings():
+            compressed = compress(content, encoding, precompressed=True)
+            if len(compressed) >= len(content):
+                continue
+            with open(path + ENCODING_SUFFIXES[encoding], "wb") as target:
+                target.write(compressed)
@@ -0,0 +1,21 @@
+import base64
+
+from django.utils.dateparse import parse_datetime
+
+
+def encode_sync_token(updated_at, pk):
+    raw = f"{updated_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sync_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        updated_at, pk = raw.split("|")
+        updated_at = parse_datetime(updated_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid sync token")
+    if updated_at is None:
+        raise ValueError("Invalid sync token")
+    return updated_at, pk
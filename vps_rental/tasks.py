@@ -0,0 +1,60 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from . import capacity
+from .jobs import job
+from .maintenance import archive_terminal_applications, purge_stale_drafts
+from .utils import redis_client
+
+AUDIT_LOG_KEY = "audit:applications"
+AUDIT_LOG_LENGTH = 1000
+AUDIT_ITEM_LENGTH = 50
+AUDIT_ITEM_TTL = 90 * 24 * 3600
+STATS_KEY = "stats:applications"
+
+logger = logging.getLogger(__name__)
+
+
+@job()
+def application_status_changed(
+    application_id, previous_status, new_status, actor_id=None
+):
+    entry = json.dumps(
+        {
+            "application_id": application_id,
+            "from": previous_status,
+            "to": new_status,
+            "actor_id": actor_id,
+            "at": time.time(),
+        }
+    )
+    pipe = redis_client.pipeline()
+    pipe.lpush(AUDIT_LOG_KEY, entry)
+    pipe.ltrim(AUDIT_LOG_KEY, 0, AUDIT_LOG_LENGTH - 1)
+    item_key = f"{AUDIT_LOG_KEY}:{application_id}"
+    pipe.lpush(item_key, entry)
+    pipe.ltrim(item_key, 0, AUDIT_ITEM_LENGTH - 1)
+    pipe.expire(item_key, AUDIT_ITEM_TTL)
+    pipe.hincrby(STATS_KEY, new_status, 1)
+    pipe.execute()
+
+
+@job(name="purge_stale_drafts", max_attempts=1)
+def purge_stale_drafts_job():
+    reclaimed = purge_stale_drafts(settings.DRAFT_TTL_DAYS)
+    logger.info("Purged stale drafts: %s", reclaimed)
+
+
+@job(name="archive_applications", max_attempts=1)
+def archive_applications_job():
+    moved = archive_terminal_applications(settings.ARCHIVE_AFTER_DAYS)
+    logger.info("Archived applications: %s", moved)
+
+
+@job(name="reconcile_capacity", max_attempts=1)
+def reconcile_capacity_job():
+    services = capacity.reconcile()
+    logger.info("Reconciled capacity counters: %s", services)
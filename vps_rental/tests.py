@@ -1,3 +1,813 @@
-from django.test import TestCase
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.utils import timezone
+from minio.error import S3Error
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from . import capacity
+from .batch import BatchError, build_request, execute, parse_batch, run_batch
+from .idempotency import idempotent
+from .models import (Application, ApplicationService, ApplicationStatus,
+                     ArchivedApplication, ArchivedApplicationService, Service,
+                     TransitionConflict)
+from .uploads import (UploadError, confirm_service_image_upload,
+                      issue_service_image_upload)
+from .utils import (POOL_EXHAUSTED, CircuitBreaker, RedisMetrics,
+                    RedisUnavailable, ResilientRedis, redis_client)
+
+
+class FakeMinio:
+    """In-memory stand-in for the MinIO client used by the upload flow."""
+
+    def __init__(self):
+        self.objects = {}
+        self.policies = []
+        self.removed = []
+
+    def put(self, key, content_type, size):
+        self.objects[key] = SimpleNamespace(content_type=content_type, size=size)
+
+    def presigned_post_policy(self, policy):
+        self.policies.append(policy)
+        return {"policy": "encoded-policy", "x-amz-signature": "signature"}
+
+    def stat_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise S3Error(
+                "NoSuchKey",
+                "Object does not exist",
+                object_name,
+                "request-id",
+                "host-id",
+                None,
+                bucket_name=bucket_name,
+                object_name=object_name,
+            )
+        return self.objects[object_name]
+
+    def remove_object(self, bucket_name, object_name):
+        self.removed.append(object_name)
+        self.objects.pop(object_name, None)
+
+
+class ServiceImageUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.minio = FakeMinio()
+        for name in ("minio_client", "minio_public_client"):
+            patcher = mock.patch(f"vps_rental.uploads.{name}", self.minio)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_issue_signs_key_under_service_prefix(self):
+        upload = issue_service_image_upload(7, "image/png")
+
+        self.assertTrue(upload["key"].startswith("services/7/"))
+        self.assertTrue(upload["key"].endswith(".png"))
+        self.assertEqual(upload["fields"]["key"], upload["key"])
+        self.assertEqual(upload["fields"]["Content-Type"], "image/png")
+        self.assertEqual(upload["fields"]["x-amz-signature"], "signature")
+        self.assertTrue(upload["url"].endswith(f"/{settings.SERVICE_IMAGE_BUCKET}"))
+        self.assertEqual(len(self.minio.policies), 1)
+
+    def test_issue_policy_expires_after_configured_window(self):
+        now = timezone.now()
+        with mock.patch("vps_rental.uploads.timezone.now", return_value=now):
+            issue_service_image_upload(7, "image/png")
+
+        expires = timedelta(seconds=settings.SERVICE_IMAGE_UPLOAD_EXPIRES)
+        self.assertEqual(self.minio.policies[0]._expiration, now + expires)
+
+    def test_issue_rejects_unsupported_content_type(self):
+        with self.assertRaises(UploadError):
+            issue_service_image_upload(7, "application/x-msdownload")
+        self.assertEqual(self.minio.policies, [])
+
+    def test_confirm_accepts_uploaded_object(self):
+        key = issue_service_image_upload(7, "image/png")["key"]
+        self.minio.put(key, "image/png", 1024)
+
+        self.assertEqual(confirm_service_image_upload(7, key), key)
+        self.assertEqual(self.minio.removed, [])
+
+    def test_confirm_rejects_key_of_another_service(self):
+        key = issue_service_image_upload(8, "image/png")["key"]
+        self.minio.put(key, "image/png", 1024)
+
+        with self.assertRaises(UploadError):
+            confirm_service_image_upload(7, key)
+        self.assertIn(key, self.minio.objects)
+
+    def test_confirm_rejects_missing_key(self):
+        with self.assertRaises(UploadError):
+            confirm_service_image_upload(7, "")
+
+    def test_confirm_rejects_upload_that_never_arrived(self):
+        # MinIO refuses POSTs after the policy expires, so nothing is stored.
+        key = issue_service_image_upload(7, "image/png")["key"]
+
+        with self.assertRaisesMessage(UploadError, "has not been uploaded"):
+            confirm_service_image_upload(7, key)
+
+    def test_confirm_removes_object_with_wrong_content_type(self):
+        key = issue_service_image_upload(7, "image/png")["key"]
+        self.minio.put(key, "text/html", 1024)
+
+        with self.assertRaisesMessage(UploadError, "content type"):
+            confirm_service_image_upload(7, key)
+        self.assertEqual(self.minio.removed, [key])
+
+    def test_confirm_removes_oversized_object(self):
+        key = issue_service_image_upload(7, "image/png")["key"]
+        self.minio.put(key, "image/png", settings.SERVICE_IMAGE_MAX_SIZE + 1)
+
+        with self.assertRaisesMessage(UploadError, "size limit"):
+            confirm_service_image_upload(7, key)
+        self.assertEqual(self.minio.removed, [key])
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class ApplicationClaimConcurrencyTests(TransactionTestCase):
+    claimers = 8
+    applications = 200
+
+    def setUp(self):
+        customer = User.objects.create_user("customer")
+        self.moderators = [
+            User.objects.create_user(f"moderator{i}", is_staff=True)
+            for i in range(self.claimers)
+        ]
+        Application.objects.bulk_create(
+            Application(user_creator=customer, status=ApplicationStatus.FORMED)
+            for _ in range(self.applications)
+        )
+
+    def test_parallel_claimers_never_share_an_application(self):
+        claimed = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.claimers)
+
+        def claim(moderator):
+            try:
+                start.wait()
+                while True:
+                    batch = list(
+                        Application.claim_next(
+                            moderator, limit=3, lease=timedelta(minutes=10)
+                        ).values_list("pk", flat=True)
+                    )
+                    if not batch:
+                        return
+                    with lock:
+                        claimed.extend(batch)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=claim, args=(moderator,))
+            for moderator in self.moderators
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        duplicates = [pk for pk, count in Counter(claimed).items() if count > 1]
+        self.assertEqual(duplicates, [])
+        self.assertEqual(len(claimed), self.applications)
+        self.assertFalse(
+            Application.objects.filter(claimed_until__isnull=True).exists()
+        )
+
+
+class ApplicationTransitionTests(TransactionTestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user("customer")
+        self.moderator = User.objects.create_user("moderator", is_staff=True)
+        self.application = Application.objects.create(
+            user_creator=self.customer, status=ApplicationStatus.FORMED
+        )
+
+    def test_transition_saves_status_and_changes(self):
+        previous = self.application.transition_to(
+            ApplicationStatus.COMPLETED, user_moderator=self.moderator
+        )
+
+        self.assertEqual(previous, ApplicationStatus.FORMED)
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, ApplicationStatus.COMPLETED)
+        self.assertEqual(self.application.user_moderator, self.moderator)
+
+    def test_disallowed_transition_is_rejected(self):
+        with self.assertRaisesMessage(TransitionConflict, "Cannot change status"):
+            self.application.transition_to(ApplicationStatus.FORMED)
+
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, ApplicationStatus.FORMED)
+
+    def test_stale_instance_conflicts(self):
+        stale = Application.objects.get(pk=self.application.pk)
+        self.application.transition_to(ApplicationStatus.COMPLETED)
+
+        with self.assertRaisesMessage(TransitionConflict, "modified concurrently"):
+            stale.transition_to(ApplicationStatus.REJECTED)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ApplicationStatus.COMPLETED)
+
+    def test_failed_condition_conflicts(self):
+        with self.assertRaises(TransitionConflict):
+            self.application.transition_to(
+                ApplicationStatus.COMPLETED,
+                condition=Q(user_moderator=self.moderator),
+            )
+
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, ApplicationStatus.FORMED)
+
+    def test_parallel_moderators_cannot_both_decide(self):
+        outcomes = []
+        lock = threading.Lock()
+        start = threading.Barrier(2)
+
+        def decide(new_status):
+            application = Application.objects.get(pk=self.application.pk)
+            try:
+                start.wait()
+                application.transition_to(new_status)
+                outcome = new_status
+            except TransitionConflict:
+                outcome = "conflict"
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [
+            threading.Thread(target=decide, args=(new_status,))
+            for new_status in (ApplicationStatus.COMPLETED, ApplicationStatus.REJECTED)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("conflict"), 1)
+        decided = next(outcome for outcome in outcomes if outcome != "conflict")
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, decided)
+
+
+class PartialIndexPlanTests(TestCase):
+    """
+    The tables are tiny in tests, so sequential scans are disabled for the
+    transaction; the planner then still has to pick the cheapest index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(f"user{i}") for i in range(20)]
+        cls.user = users[0]
+        statuses = [
+            ApplicationStatus.COMPLETED,
+            ApplicationStatus.REJECTED,
+            ApplicationStatus.DELETED,
+            ApplicationStatus.FORMED,
+        ]
+        Application.objects.bulk_create(
+            Application(user_creator=user, status=statuses[i % len(statuses)])
+            for user in users
+            for i in range(25)
+        )
+        Application.objects.bulk_create(
+            Application(user_creator=user, status=ApplicationStatus.DRAFT)
+            for user in users
+        )
+        Service.objects.bulk_create(
+            Service(
+                name=f"VPS {i}",
+                mini_description="",
+                description="",
+                price=100,
+                is_active=i % 10 == 0,
+                processor="",
+                ram="",
+                disk="",
+                internet_speed="",
+            )
+            for i in range(500)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE vps_rental_application")
+            cursor.execute("ANALYZE vps_rental_service")
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_draft_lookup_uses_single_draft_index(self):
+        plan = self.explain(
+            Application.objects.filter(
+                user_creator=self.user, status=ApplicationStatus.DRAFT
+            )
+        )
+        self.assertIn("application_single_draft", plan)
+
+    def test_live_application_list_uses_live_index(self):
+        plan = self.explain(
+            Application.objects.filter(user_creator=self.user)
+            .exclude(status__in=[ApplicationStatus.DRAFT, ApplicationStatus.DELETED])
+            .order_by("created_at")
+        )
+        self.assertIn("application_live", plan)
+
+    def test_active_services_use_partial_index(self):
+        plan = self.explain(Service.objects.filter(is_active=True).order_by("id"))
+        self.assertIn("service_active", plan)
+
+    def test_second_draft_for_user_is_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Application.objects.create(
+                user_creator=self.user, status=ApplicationStatus.DRAFT
+            )
+
+
+class FakeRedis:
+    """Redis stand-in that can be made slow, unreachable or out of connections."""
+
+    socket_timeout = 0.05
+
+    def __init__(self):
+        self.latency = 0
+        self.down = False
+        self.exhausted = False
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        if self.exhausted:
+            raise redis.ConnectionError(POOL_EXHAUSTED)
+        if self.down:
+            raise redis.ConnectionError("Error 111 connecting to redis:6379.")
+        if self.latency >= self.socket_timeout:
+            time.sleep(self.socket_timeout)
+            raise redis.TimeoutError("Timeout reading from socket")
+        time.sleep(self.latency)
+        return "value"
+
+
+class ResilientRedisTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeRedis()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        self.metrics = RedisMetrics()
+        self.client = ResilientRedis(self.fake, self.breaker, self.metrics)
+
+    def fail_calls(self, times):
+        for _ in range(times):
+            with self.assertRaises(RedisUnavailable):
+                self.client.get("key")
+
+    def half_open(self):
+        self.breaker.opened_at = time.monotonic() - self.breaker.reset_timeout
+
+    def test_connection_errors_open_the_circuit(self):
+        self.fake.down = True
+        self.fail_calls(3)
+
+        self.assertEqual(self.breaker.state, "open")
+        self.fail_calls(1)
+        self.assertEqual(self.fake.calls, 3)
+        self.assertEqual(self.metrics.snapshot()["get"]["rejected"], 1)
+
+    def test_timeouts_open_the_circuit(self):
+        self.fake.latency = 1
+        self.fail_calls(3)
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.metrics.snapshot()["get"]["errors"], 3)
+
+    def test_slow_calls_are_timed(self):
+        self.fake.latency = 0.01
+
+        self.assertEqual(self.client.get("key"), "value")
+        stats = self.metrics.snapshot()["get"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertGreaterEqual(stats["max_ms"], 10)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_pool_exhaustion_does_not_open_the_circuit(self):
+        self.fake.exhausted = True
+        self.fail_calls(10)
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.failures, 0)
+        self.assertEqual(self.fake.calls, 10)
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.fake.down = True
+        self.fail_calls(3)
+        self.fake.down = False
+        self.half_open()
+
+        self.assertEqual(self.client.get("key"), "value")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_failed_trial_keeps_the_circuit_open(self):
+        self.fake.down = True
+        self.fail_calls(3)
+        self.half_open()
+        self.fail_calls(1)
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.fake.calls, 4)
+
+    def test_exhausted_trial_lets_the_next_call_through(self):
+        self.fake.down = True
+        self.fail_calls(3)
+        self.half_open()
+        self.fake.down = False
+        self.fake.exhausted = True
+        self.fail_calls(1)
+
+        self.assertEqual(self.breaker.state, "half-open")
+        self.fake.exhausted = False
+        self.assertEqual(self.client.get("key"), "value")
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class FakeRedisStore:
+    """In-memory stand-in for the Redis commands behind idempotent views."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def check(self):
+        if self.down:
+            raise RedisUnavailable("Redis circuit is open")
+
+    def get(self, key):
+        self.check()
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        self.check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def release_lock(self, key, token):
+        self.check()
+        if self.data.get(key) != token:
+            return 0
+        del self.data[key]
+        return 1
+
+
+class CountingView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    calls = []
+
+    @idempotent
+    def post(self, request):
+        self.calls.append(request.data)
+        return Response({"call": len(self.calls)}, status=201)
+
+
+RESULT_KEY = "idempotency:user:1:POST:/api/orders/:key-1"
+
+
+class IdempotentViewTests(SimpleTestCase):
+    def setUp(self):
+        self.store = FakeRedisStore()
+        for name, value in (
+            ("redis_client", self.store),
+            ("release_lock", self.store.release_lock),
+        ):
+            patcher = mock.patch(f"vps_rental.idempotency.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        CountingView.calls = []
+        self.factory = APIRequestFactory()
+        self.user = User(pk=1, username="customer")
+
+    def post(self, data, key="key-1", user=None):
+        request = self.factory.post(
+            "/api/orders/", data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+        force_authenticate(request, user=user or self.user)
+        return CountingView.as_view()(request)
+
+    def test_repeated_key_replays_the_first_response(self):
+        first = self.post({"service_id": 1})
+        second = self.post({"service_id": 1})
+
+        self.assertEqual(len(CountingView.calls), 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+
+    def test_reused_key_with_other_payload_is_rejected(self):
+        self.post({"service_id": 1})
+        response = self.post({"service_id": 2})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(CountingView.calls), 1)
+
+    def test_fingerprints_are_not_plain_hashes_of_the_payload(self):
+        self.post({"password": "hunter2"})
+
+        stored = self.store.data[RESULT_KEY]
+        plain = hashlib.sha256(b'{"password": "hunter2"}').hexdigest()
+        self.assertNotIn("hunter2", stored)
+        self.assertNotIn(plain, stored)
+
+    def test_keys_are_scoped_per_user(self):
+        self.post({"service_id": 1})
+        response = self.post({"service_id": 1}, user=User(pk=2, username="other"))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(CountingView.calls), 2)
+
+    @override_settings(IDEMPOTENCY_WAIT=0.1)
+    def test_duplicate_in_progress_conflicts(self):
+        self.store.data[f"{RESULT_KEY}:lock"] = "other-request"
+
+        response = self.post({"service_id": 1})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CountingView.calls, [])
+
+    def test_lock_is_released_after_the_view(self):
+        self.post({"service_id": 1})
+
+        self.assertFalse([key for key in self.store.data if key.endswith(":lock")])
+
+    def test_view_runs_when_redis_is_down(self):
+        self.store.down = True
+
+        self.post({"service_id": 1})
+        self.post({"service_id": 1})
+
+        self.assertEqual(len(CountingView.calls), 2)
+
+
+class CapacityTests(TransactionTestCase):
+    """Runs the reserve and release scripts against the configured Redis."""
+
+    def setUp(self):
+        try:
+            redis_client.ping()
+        except redis.RedisError:
+            self.skipTest("Redis is not available")
+        # Keep test counters apart from the ones the app uses.
+        patcher = mock.patch(
+            "vps_rental.capacity.CAPACITY_KEY", "test:capacity:service:{id}"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = User.objects.create_user("customer")
+        self.services = []
+
+    def tearDown(self):
+        keys = [capacity.capacity_key(service.pk) for service in self.services]
+        if keys:
+            redis_client.delete(*keys)
+
+    def service(self, limit):
+        # bulk_create skips the signals that index services in Redis.
+        (service,) = Service.objects.bulk_create(
+            [
+                Service(
+                    name="VPS",
+                    mini_description="",
+                    description="",
+                    price=100,
+                    processor="",
+                    ram="",
+                    disk="",
+                    internet_speed="",
+                    capacity=limit,
+                )
+            ]
+        )
+        self.services.append(service)
+        return service
+
+    def application(self, lines, status=ApplicationStatus.DRAFT):
+        application = Application.objects.create(
+            user_creator=self.customer, status=status
+        )
+        ApplicationService.objects.bulk_create(
+            ApplicationService(application=application, service=service, quantity=n)
+            for service, n in lines
+        )
+        return application
+
+    def remaining(self, service):
+        return int(redis_client.get(capacity.capacity_key(service.pk)))
+
+    def test_reserve_takes_capacity_and_release_returns_it(self):
+        service = self.service(5)
+        lines = capacity.reserve(self.application([(service, 3)]))
+
+        self.assertEqual(self.remaining(service), 2)
+        capacity.release(lines)
+        self.assertEqual(self.remaining(service), 5)
+
+    def test_reserve_is_all_or_nothing(self):
+        roomy, scarce = self.service(5), self.service(1)
+
+        with self.assertRaises(capacity.CapacityExceeded) as raised:
+            capacity.reserve(self.application([(roomy, 2), (scarce, 2)]))
+        self.assertEqual(raised.exception.service, scarce)
+        self.assertEqual(self.remaining(roomy), 5)
+        self.assertEqual(self.remaining(scarce), 1)
+
+    def test_unlimited_services_are_not_counted(self):
+        service = self.service(None)
+
+        self.assertEqual(capacity.reserve(self.application([(service, 9)])), [])
+        self.assertIsNone(redis_client.get(capacity.capacity_key(service.pk)))
+
+    def test_parallel_reservations_never_oversell(self):
+        service = self.service(5)
+        applications = [self.application([(service, 1)]) for _ in range(8)]
+        capacity.initialize([service])
+        outcomes = []
+        lock = threading.Lock()
+        start = threading.Barrier(len(applications))
+
+        def reserve(application):
+            try:
+                start.wait()
+                capacity.reserve(application)
+                outcome = "reserved"
+            except capacity.CapacityExceeded:
+                outcome = "exceeded"
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [
+            threading.Thread(target=reserve, args=(application,))
+            for application in applications
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("reserved"), 5)
+        self.assertEqual(outcomes.count("exceeded"), 3)
+        self.assertEqual(self.remaining(service), 0)
+
+    def test_reconcile_counts_live_and_archived_rentals(self):
+        service = self.service(10)
+        self.application([(service, 2)], status=ApplicationStatus.FORMED)
+        self.application([(service, 4)], status=ApplicationStatus.REJECTED)
+        now = timezone.now()
+        archived = ArchivedApplication.objects.create(
+            id=10_000,
+            status=ApplicationStatus.COMPLETED,
+            created_at=now,
+            updated_at=now,
+            user_creator=self.customer,
+        )
+        ArchivedApplicationService.objects.create(
+            id=10_000, application=archived, service=service, quantity=3
+        )
+        redis_client.set(capacity.capacity_key(service.pk), 0)
+
+        capacity.reconcile()
+
+        self.assertEqual(self.remaining(service), 5)
+
+
+class BatchTests(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().post(
+            "/api/batch/",
+            content_type="application/json",
+            HTTP_ACCEPT_ENCODING="br",
+            HTTP_IDEMPOTENCY_KEY="batch-key",
+            HTTP_COOKIE="sessionid=abc",
+        )
+        self.request.user = User(pk=1, username="customer")
+        self.request.session = {"draft": 1}
+
+    def test_parse_rejects_malformed_batches(self):
+        for data in (None, [], [{"method": "GET"}], [{"path": "/", "method": "TRACE"}]):
+            with self.subTest(data=data), self.assertRaises(BatchError):
+                parse_batch(data)
+        with override_settings(BATCH_MAX_REQUESTS=2), self.assertRaises(BatchError):
+            parse_batch([{"path": "/api/services/"}] * 3)
+
+    def test_sub_request_gets_own_method_body_and_headers(self):
+        (sub_request,) = parse_batch(
+            [
+                {
+                    "method": "put",
+                    "path": "/api/app/7/?x=1",
+                    "body": {"status": "COMPLETED"},
+                    "headers": {"X-Trace": "t-1"},
+                }
+            ]
+        )
+        sub = build_request(self.request, sub_request, "/api/app/7/", "x=1")
+
+        self.assertEqual(sub.method, "PUT")
+        self.assertEqual(sub.path, "/api/app/7/")
+        self.assertEqual(sub.GET["x"], "1")
+        self.assertEqual(sub.body, b'{"status": "COMPLETED"}')
+        self.assertEqual(sub.headers["X-Trace"], "t-1")
+        self.assertEqual(sub.headers["Accept"], "application/json")
+        # Headers describing the batch request itself are not inherited.
+        self.assertNotIn("Accept-Encoding", sub.headers)
+        self.assertNotIn("Idempotency-Key", sub.headers)
+        self.assertIs(sub.user, self.request.user)
+        self.assertIs(sub.session, self.request.session)
+
+    def test_excluded_and_foreign_routes_are_not_run(self):
+        for path, status_code in (
+            ("/api/batch/", 400),
+            ("/api/login/", 400),
+            ("/admin/", 404),
+            ("/api/missing/", 404),
+        ):
+            with self.subTest(path=path):
+                (sub_request,) = parse_batch([{"method": "POST", "path": path}])
+                self.assertEqual(
+                    execute(self.request, sub_request)["status"], status_code
+                )
+
+    def test_writes_wait_for_reads_and_reads_for_writes(self):
+        events = []
+        lock = threading.Lock()
+
+        def fake_execute(request, sub_request):
+            with lock:
+                events.append(("start", sub_request.index))
+            time.sleep(0.02)
+            with lock:
+                events.append(("end", sub_request.index))
+            return {"index": sub_request.index}
+
+        sub_requests = parse_batch(
+            [
+                {"path": "/api/services/1/"},
+                {"path": "/api/services/2/"},
+                {"method": "POST", "path": "/api/app/draft/"},
+                {"path": "/api/services/3/"},
+                {"path": "/api/services/4/"},
+            ]
+        )
+        with mock.patch("vps_rental.batch.execute", fake_execute), mock.patch(
+            "vps_rental.batch.connections"
+        ):
+            results = run_batch(self.request, sub_requests)
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3, 4])
+        write_start = events.index(("start", 2))
+        write_end = events.index(("end", 2))
+        self.assertEqual({events[i][1] for i in range(write_start)}, {0, 1})
+        self.assertEqual({event[1] for event in events[write_end + 1 :]}, {3, 4})
+
+    @override_settings(BATCH_MAX_WORKERS=3)
+    def test_worker_connections_are_closed_once_per_thread(self):
+        closed = []
+        connections = mock.Mock()
+        connections.close_all.side_effect = lambda: closed.append(threading.get_ident())
+        sub_requests = parse_batch([{"path": f"/api/services/{i}/"} for i in range(6)])
+
+        with mock.patch(
+            "vps_rental.batch.execute", lambda request, sub: {"index": sub.index}
+        ), mock.patch("vps_rental.batch.connections", connections):
+            run_batch(self.request, sub_requests)
+
+        self.assertEqual(len(closed), 3)
+        self.assertEqual(len(set(closed)), 3)
+        self.assertNotIn(threading.get_ident(), closed)
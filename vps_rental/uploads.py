@@ -0,0 +1,67 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from minio.datatypes import PostPolicy
+from minio.error import S3Error
+
+from .utils import minio_client, minio_public_client
+
+
+class UploadError(ValueError):
+    pass
+
+
+def service_image_prefix(service_id):
+    return f"services/{service_id}/"
+
+
+def issue_service_image_upload(service_id, content_type):
+    extension = settings.SERVICE_IMAGE_CONTENT_TYPES.get(content_type)
+    if extension is None:
+        allowed = ", ".join(settings.SERVICE_IMAGE_CONTENT_TYPES)
+        raise UploadError(f"Unsupported content_type. Allowed: {allowed}.")
+
+    key = f"{service_image_prefix(service_id)}{uuid.uuid4().hex}.{extension}"
+    expires = timedelta(seconds=settings.SERVICE_IMAGE_UPLOAD_EXPIRES)
+
+    policy = PostPolicy(settings.SERVICE_IMAGE_BUCKET, timezone.now() + expires)
+    policy.add_equals_condition("key", key)
+    policy.add_equals_condition("Content-Type", content_type)
+    policy.add_content_length_range_condition(1, settings.SERVICE_IMAGE_MAX_SIZE)
+    fields = minio_public_client.presigned_post_policy(policy)
+    fields.update({"key": key, "Content-Type": content_type})
+
+    scheme = "https" if settings.MINIO_EXTERNAL_ENDPOINT_USE_HTTPS else "http"
+    endpoint = settings.MINIO_EXTERNAL_ENDPOINT
+    return {
+        "url": f"{scheme}://{endpoint}/{settings.SERVICE_IMAGE_BUCKET}",
+        "fields": fields,
+        "key": key,
+        "expires_in": settings.SERVICE_IMAGE_UPLOAD_EXPIRES,
+        "max_size": settings.SERVICE_IMAGE_MAX_SIZE,
+    }
+
+
+def confirm_service_image_upload(service_id, key):
+    if not key or not key.startswith(service_image_prefix(service_id)):
+        raise UploadError("Key does not belong to this service.")
+
+    try:
+        stat = minio_client.stat_object(settings.SERVICE_IMAGE_BUCKET, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise UploadError("Object has not been uploaded.")
+        raise
+
+    problem = None
+    if stat.content_type not in settings.SERVICE_IMAGE_CONTENT_TYPES:
+        problem = "Uploaded object has an unsupported content type."
+    elif not 0 < stat.size <= settings.SERVICE_IMAGE_MAX_SIZE:
+        problem = "Uploaded object exceeds the size limit."
+
+    if problem:
+        minio_client.remove_object(settings.SERVICE_IMAGE_BUCKET, key)
+        raise UploadError(problem)
+    return key
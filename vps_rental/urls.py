@@ -4,9 +4,23 @@ from vps_rental import views
 
 urlpatterns = [
     path(r"services/", views.ServiceList.as_view(), name="services-list"),
+    path(r"services/popular/", views.ServicePopular.as_view(), name="services-popular"),
+    path(
+        r"services/autocomplete/",
+        views.ServiceAutocomplete.as_view(),
+        name="services-autocomplete",
+    ),
     path(r"services-add/", views.ServiceAdd.as_view(), name="services-add"),
     path(r"services/<int:pk>/", views.ServiceDetail.as_view(), name="services-detail"),
+    path(
+        r"services/<int:pk>/image/",
+        views.ServiceImageUpload.as_view(),
+        name="services-image-upload",
+    ),
     path(r"app/", views.ApplicationList.as_view(), name="application-list"),
+    path(r"app/claim/", views.ApplicationClaim.as_view(), name="application-claim"),
+    path(r"app/events/", views.ApplicationEvents.as_view(), name="application-events"),
+    path(r"app/export/", views.ApplicationExport.as_view(), name="application-export"),
     path(
         r"app/<int:pk>/", views.ApplicationDetail.as_view(), name="application-detail"
     ),
@@ -24,9 +38,17 @@ urlpatterns = [
     path(r"login/", views.LoginView.as_view(), name="login"),
     path(r"logout/", views.LogoutView.as_view(), name="logout"),
     path(r"user/", views.UserView.as_view(), name="user"),
+    path(r"metrics/", views.MetricsView.as_view(), name="metrics"),
+    path(r"profiles/", views.ProfileList.as_view(), name="profile-list"),
+    path(
+        r"profiles/<str:profile_id>/",
+        views.ProfileDetail.as_view(),
+        name="profile-detail",
+    ),
     path(
         "app/draft/",
         views.DraftApplicationServiceView.as_view(),
         name="draft-application-server-add",
     ),
+    path(r"batch/", views.BatchView.as_view(), name="batch"),
 ]
@@ -1,6 +1,271 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
 import redis
+import redis.asyncio
 from django.conf import settings
+from minio import Minio
+from redis.commands.core import Script
+
+logger = logging.getLogger(__name__)
+
+# Raised by BlockingConnectionPool when every connection is checked out.
+POOL_EXHAUSTED = "No connection available."
+
+
+class RedisUnavailable(redis.ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive connection failures and
+    rejects calls for ``reset_timeout`` seconds, then lets one trial through.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is None and self.failures >= self.failure_threshold:
+                logger.error("Redis circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+            elif self.opened_at is not None:
+                # A failed half-open trial keeps the circuit open for longer.
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """End a call that says nothing about Redis health, e.g. pool waits."""
+        with self._lock:
+            self.trial_running = False
+
+
+class RedisMetrics:
+    def __init__(self):
+        self.commands = defaultdict(
+            lambda: {
+                "calls": 0,
+                "errors": 0,
+                "rejected": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+            }
+        )
+        self._lock = threading.Lock()
+
+    def record(self, command, elapsed_ms, error=False):
+        with self._lock:
+            stats = self.commands[command]
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def reject(self, command):
+        with self._lock:
+            self.commands[command]["rejected"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                command: {
+                    **stats,
+                    "avg_ms": (
+                        round(stats["total_ms"] / stats["calls"], 3)
+                        if stats["calls"]
+                        else 0.0
+                    ),
+                }
+                for command, stats in self.commands.items()
+            }
+
+
+class ResilientRedis:
+    """
+    Proxy around a redis client that times every command, feeds the circuit
+    breaker and raises RedisUnavailable instead of hanging when Redis is down.
+    """
+
+    passthrough = {"pubsub", "scan_iter", "get_encoder"}
+
+    def __init__(self, client, breaker, metrics):
+        self._client = client
+        self.breaker = breaker
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name in self.passthrough:
+            return attr
+
+        def command(*args, **kwargs):
+            return self._call(name, attr, *args, **kwargs)
+
+        return command
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self._client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+        pipe.execute = lambda *a, **kw: self._call("pipeline", execute, *a, **kw)
+        return pipe
+
+    def register_script(self, script):
+        return Script(self, script)
+
+    def _call(self, name, func, *args, **kwargs):
+        if not self.breaker.allow():
+            self.metrics.reject(name)
+            raise RedisUnavailable("Redis circuit is open")
+
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            if str(e) == POOL_EXHAUSTED:
+                # Our own pool is saturated; Redis itself may be healthy.
+                self.breaker.release_trial()
+            else:
+                self.breaker.record_failure()
+            self.metrics.record(name, self._elapsed_ms(started), error=True)
+            raise RedisUnavailable(str(e)) from e
+        except redis.RedisError:
+            self.metrics.record(name, self._elapsed_ms(started), error=True)
+            raise
+        self.breaker.record_success()
+        self.metrics.record(name, self._elapsed_ms(started))
+        return result
+
+    def _elapsed_ms(self, started):
+        return (time.perf_counter() - started) * 1000
+
+    def stats(self):
+        pool = self._client.connection_pool
+        return {
+            "circuit": self.breaker.state,
+            "pool": {
+                "max_connections": pool.max_connections,
+                "created": len(pool._connections),
+            },
+            "commands": self.metrics.snapshot(),
+        }
+
+
+def build_redis_pool(
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT, decode_responses=True
+):
+    return redis.BlockingConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        password=settings.REDIS_PASSWORD,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        socket_timeout=socket_timeout,
+        health_check_interval=30,
+        decode_responses=decode_responses,
+    )
+
+
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.REDIS_BREAKER_FAILURES,
+    reset_timeout=settings.REDIS_BREAKER_RESET,
+)
+redis_metrics = RedisMetrics()
+
+redis_client = ResilientRedis(
+    redis.StrictRedis(connection_pool=build_redis_pool()),
+    redis_breaker,
+    redis_metrics,
+)
+
+# Delete the lock only if it still holds our token; a GET followed by DEL
+# could remove a lock another process acquired after ours expired.
+RELEASE_LOCK_SCRIPT = redis_client.register_script(
+    """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+)
+
+
+def release_lock(key, token):
+    return RELEASE_LOCK_SCRIPT(keys=[key], args=[token])
+
+
+# Blocking commands (BRPOP in the job worker) wait longer than the read timeout.
+redis_blocking_client = ResilientRedis(
+    redis.StrictRedis(connection_pool=build_redis_pool(socket_timeout=None)),
+    redis_breaker,
+    redis_metrics,
+)
+
+# Compressed payloads are stored as raw bytes.
+redis_binary_client = ResilientRedis(
+    redis.StrictRedis(connection_pool=build_redis_pool(decode_responses=False)),
+    redis_breaker,
+    redis_metrics,
+)
+
+async_redis_client = redis.asyncio.StrictRedis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    password=settings.REDIS_PASSWORD,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+    decode_responses=True,
+)
+
+minio_client = Minio(
+    settings.MINIO_ENDPOINT,
+    access_key=settings.MINIO_ACCESS_KEY,
+    secret_key=settings.MINIO_SECRET_KEY,
+    secure=settings.MINIO_USE_HTTPS,
+    region=settings.MINIO_REGION,
+)
 
-redis_client = redis.StrictRedis(
-    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True
+# Presigned URLs are signed for the host the browser will talk to.
+minio_public_client = Minio(
+    settings.MINIO_EXTERNAL_ENDPOINT,
+    access_key=settings.MINIO_ACCESS_KEY,
+    secret_key=settings.MINIO_SECRET_KEY,
+    secure=settings.MINIO_EXTERNAL_ENDPOINT_USE_HTTPS,
+    region=settings.MINIO_REGION,
 )
@@ -1,10 +1,19 @@
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 
+import redis
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.core.cache import cache
-from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q, Value
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -14,22 +23,60 @@ from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Application, ApplicationService, ApplicationStatus, Service
-from .serializers import (ApplicationSerializer, LoginSerializer,
-                          RegisterSerializer, ServiceDetailSerializer,
-                          ServiceSerializer, UserSerializer)
+from . import autocomplete, capacity, popularity
+from .batch import BatchError, parse_batch, run_batch
+from .cache import service_cache
+from .compression import cache_compressed
+from .events import parse_event_id, publish_status_change, stream_events
+from .export import (EXPORT_FORMATS, ExportError, aiter_export, export_rows,
+                     iter_export)
+from .idempotency import idempotent
+from .jobs import job_metrics
+from .middleware import load_profile, recent_profiles
+from .models import (Application, ApplicationService, ApplicationStatus,
+                     ArchivedApplication, Service, TransitionConflict)
+from .serializers import (ApplicationSerializer, ArchivedApplicationSerializer,
+                          LoginSerializer, RegisterSerializer,
+                          ServiceDetailSerializer, ServiceListSerializer,
+                          UserSerializer)
+from .sync import decode_sync_token, encode_sync_token
+from .tasks import application_status_changed
+from .uploads import (UploadError, confirm_service_image_upload,
+                      issue_service_image_upload)
 from .utils import redis_client
 
+logger = logging.getLogger(__name__)
 
+
+def notify_status_change(application, previous_status, actor):
+    application_status_changed.delay(
+        application_id=application.pk,
+        previous_status=previous_status,
+        new_status=application.status,
+        actor_id=actor.pk,
+    )
+    publish_status_change(application, previous_status)
+
+
+def load_service_details(ids):
+    services = Service.objects.filter(pk__in=ids, is_active=True)
+    return {
+        str(service.pk): ServiceDetailSerializer(service).data for service in services
+    }
+
+
+@method_decorator(
+    cache_compressed("catalog", settings.CATALOG_CACHE_TTL), name="dispatch"
+)
 class ServiceList(APIView):
     model_class = Service
-    serializer_class = ServiceSerializer
+    serializer_class = ServiceListSerializer
 
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
         operation_summary="Получить список всех услуг",
-        responses={200: ServiceSerializer(many=True)},
+        responses={200: ServiceListSerializer(many=True)},
         manual_parameters=[
             openapi.Parameter(
                 "query",
@@ -37,10 +84,26 @@ class ServiceList(APIView):
                 description="Фильтр по имени или описанию",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "ids",
+                openapi.IN_QUERY,
+                description="ID услуг через запятую (полные карточки в том же порядке)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "ordering",
+                openapi.IN_QUERY,
+                description="popular - сначала самые востребованные за неделю",
+                type=openapi.TYPE_STRING,
+                enum=["popular"],
+            ),
         ],
         tags=["services"],
     )
     def get(self, request, format=None):
+        if "ids" in request.query_params:
+            return self.get_many(request.query_params["ids"])
+
         try:
             query = request.query_params.get("query", "")
             services = self.model_class.objects.filter(is_active=True)
@@ -48,7 +111,21 @@ class ServiceList(APIView):
             if query:
                 services = services.filter(Q(name__icontains=query)).distinct()
 
-            serializer = self.serializer_class(services, many=True)
+            if request.query_params.get("ordering") == "popular":
+                try:
+                    ranking = dict(popularity.top("week"))
+                except redis.RedisError:
+                    ranking = {}
+                services = sorted(
+                    services, key=lambda service: -ranking.get(service.pk, 0)
+                )
+
+            services = list(services)
+            serializer = self.serializer_class(
+                services,
+                many=True,
+                context={"availability": capacity.availability(services)},
+            )
             return Response(
                 {"status": "success", "data": serializer.data},
                 status=status.HTTP_200_OK,
@@ -59,6 +136,137 @@ class ServiceList(APIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def get_many(self, ids_param):
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids_param.split(",") if pk))
+        except ValueError:
+            return Response(
+                {"status": "error", "detail": "ids must be comma-separated integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 < len(ids) <= settings.SERVICE_BATCH_MAX:
+            return Response(
+                {
+                    "status": "error",
+                    "detail": f"Pass between 1 and {settings.SERVICE_BATCH_MAX} ids",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            found = service_cache.get_many(ids, load_service_details)
+            data = [found[str(pk)] for pk in ids if found[str(pk)] is not None]
+            missing = [pk for pk in ids if found[str(pk)] is None]
+            return Response(
+                {"status": "success", "data": data, "missing": missing},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ServicePopular(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Самые востребованные услуги за день/неделю",
+        manual_parameters=[
+            openapi.Parameter(
+                "window",
+                openapi.IN_QUERY,
+                description="Окно: day или week",
+                type=openapi.TYPE_STRING,
+                enum=list(popularity.WINDOWS),
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Количество услуг",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={200: ServiceDetailSerializer(many=True)},
+        tags=["services"],
+    )
+    def get(self, request, format=None):
+        window = request.query_params.get("window", "week")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if window not in popularity.WINDOWS or not (
+            0 < limit <= settings.SERVICE_BATCH_MAX
+        ):
+            return Response(
+                {"status": "error", "detail": "Invalid window or limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            ranked = popularity.top(window, limit)
+            found = service_cache.get_many(
+                [service_id for service_id, _ in ranked], load_service_details
+            )
+            data = []
+            for service_id, score in ranked:
+                service = found[str(service_id)]
+                if service is not None:
+                    data.append({**service, "score": score})
+            return Response(
+                {"status": "success", "data": data},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ServiceAutocomplete(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Подсказки для поиска услуг по префиксу",
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="Префикс названия или характеристики",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Количество подсказок",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        tags=["services"],
+    )
+    def get(self, request, format=None):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.SERVICE_BATCH_MAX:
+            return Response(
+                {"status": "error", "detail": "Invalid limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            data = autocomplete.suggest(request.query_params.get("q", ""), limit)
+            return Response(
+                {"status": "success", "data": data},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 
 class ServiceAdd(APIView):
     model_class = Service
@@ -73,6 +281,7 @@ class ServiceAdd(APIView):
         tags=["services"],
         consumes=["multipart/form-data"],
     )
+    @idempotent
     def post(self, request, format=None):
         try:
             serializer = self.serializer_class(data=request.data)
@@ -103,6 +312,12 @@ class ServiceDetail(APIView):
         else:
             return [IsAdminUser()]
 
+    def load_service(self, pk):
+        service = self.model_class.objects.filter(pk=pk, is_active=True).first()
+        if service is None:
+            return None
+        return self.serializer_class(service).data
+
     @swagger_auto_schema(
         operation_summary="Получить один сервис по ID с характеристиками",
         responses={200: ServiceDetailSerializer},
@@ -110,10 +325,14 @@ class ServiceDetail(APIView):
     )
     def get(self, request, pk, format=None):
         try:
-            service = get_object_or_404(self.model_class, pk=pk, is_active=True)
-            serializer = self.serializer_class(service)
+            data = service_cache.get_or_load(pk, lambda: self.load_service(pk))
+            if data is None:
+                return Response(
+                    {"status": "error", "detail": "Услуга не найдена или неактивна"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
             return Response(
-                {"status": "success", "data": serializer.data},
+                {"status": "success", "data": data},
                 status=status.HTTP_200_OK,
             )
         except Exception as e:
@@ -172,6 +391,86 @@ class ServiceDetail(APIView):
             )
 
 
+class ServiceImageUpload(APIView):
+    model_class = Service
+    serializer_class = ServiceDetailSerializer
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Получить presigned POST для загрузки изображения в MinIO",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["content_type"],
+            properties={"content_type": openapi.Schema(type=openapi.TYPE_STRING)},
+        ),
+        tags=["service"],
+    )
+    def post(self, request, pk, format=None):
+        try:
+            if not self.model_class.objects.filter(pk=pk).exists():
+                return Response(
+                    {"status": "error", "detail": "Услуга не найдена"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            upload = issue_service_image_upload(pk, request.data.get("content_type"))
+            return Response(
+                {"status": "success", "data": upload},
+                status=status.HTTP_201_CREATED,
+            )
+        except UploadError as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @swagger_auto_schema(
+        operation_summary="Подтвердить загруженное изображение и привязать к услуге",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["key"],
+            properties={"key": openapi.Schema(type=openapi.TYPE_STRING)},
+        ),
+        responses={200: ServiceDetailSerializer},
+        tags=["service"],
+    )
+    def put(self, request, pk, format=None):
+        try:
+            service = self.model_class.objects.filter(pk=pk).first()
+            if service is None:
+                return Response(
+                    {"status": "error", "detail": "Услуга не найдена"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            service.image.name = confirm_service_image_upload(
+                pk, request.data.get("key")
+            )
+            service.save(update_fields=["image"])
+
+            serializer = self.serializer_class(service)
+            return Response(
+                {"status": "success", "data": serializer.data},
+                status=status.HTTP_200_OK,
+            )
+        except UploadError as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+ORDERING_FIELDS = ["created_at", "-created_at", "total_price", "-total_price"]
+
+
 class ApplicationList(APIView):
     model_class = Application
     serializer_class = ApplicationSerializer
@@ -187,26 +486,225 @@ class ApplicationList(APIView):
                 description="Фильтр по статусу",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "min_total",
+                openapi.IN_QUERY,
+                description="Минимальная сумма заявки",
+                type=openapi.TYPE_NUMBER,
+            ),
+            openapi.Parameter(
+                "max_total",
+                openapi.IN_QUERY,
+                description="Максимальная сумма заявки",
+                type=openapi.TYPE_NUMBER,
+            ),
+            openapi.Parameter(
+                "ordering",
+                openapi.IN_QUERY,
+                description="Сортировка",
+                type=openapi.TYPE_STRING,
+                enum=ORDERING_FIELDS,
+            ),
+            openapi.Parameter(
+                "include_archived",
+                openapi.IN_QUERY,
+                description="Включить архивные заявки (true)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Размер страницы (только с include_archived)",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                "offset",
+                openapi.IN_QUERY,
+                description="Смещение страницы (только с include_archived)",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                "updated_since",
+                openapi.IN_QUERY,
+                description="Токен синхронизации: вернуть только изменения "
+                "(пустое значение - полная синхронизация)",
+                type=openapi.TYPE_STRING,
+            ),
         ],
         responses={200: ApplicationSerializer(many=True)},
         tags=["applications"],
     )
     def get(self, request, format=None):
+        if "updated_since" in request.query_params:
+            return self.get_changes(request, request.query_params["updated_since"])
+
         try:
-            applications = self.model_class.objects.exclude(
-                status__in=[ApplicationStatus.DRAFT, ApplicationStatus.DELETED]
+            applications = self.filter_applications(
+                request,
+                self.model_class.objects.exclude(
+                    status__in=[ApplicationStatus.DRAFT, ApplicationStatus.DELETED]
+                ),
             )
+            if request.query_params.get("include_archived") == "true":
+                return self.get_with_archive(request, applications)
 
-            if not request.user.is_staff:
-                applications = applications.filter(user_creator=request.user)
+            serializer = self.serializer_class(
+                applications.prefetch_related("services__service"), many=True
+            )
+            return Response(
+                {"status": "success", "data": serializer.data},
+                status=status.HTTP_200_OK,
+            )
+        except ValueError as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
-            status_name = request.query_params.get("status")
-            if status_name:
-                applications = applications.filter(status=status_name)
+    def filter_applications(self, request, applications):
+        if not request.user.is_staff:
+            applications = applications.filter(user_creator=request.user)
 
-            serializer = self.serializer_class(applications, many=True)
+        status_name = request.query_params.get("status")
+        if status_name:
+            applications = applications.filter(status=status_name)
+
+        try:
+            min_total = request.query_params.get("min_total")
+            if min_total:
+                applications = applications.filter(total_price__gte=Decimal(min_total))
+            max_total = request.query_params.get("max_total")
+            if max_total:
+                applications = applications.filter(total_price__lte=Decimal(max_total))
+        except InvalidOperation:
+            raise ValueError("min_total/max_total must be numbers")
+
+        ordering = request.query_params.get("ordering")
+        if ordering:
+            if ordering not in ORDERING_FIELDS:
+                raise ValueError("Invalid ordering")
+            applications = applications.order_by(ordering, "id")
+        return applications
+
+    def get_with_archive(self, request, applications):
+        """
+        One page of live and archived applications, merged and paginated in
+        SQL with a UNION ALL, then loaded in full by primary key.
+        """
+        page_size = settings.APPLICATION_ARCHIVE_PAGE_SIZE
+        try:
+            limit = int(request.query_params.get("limit", page_size))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            raise ValueError("limit/offset must be integers")
+        if not 0 < limit <= page_size or offset < 0:
+            raise ValueError(
+                f"limit must be between 1 and {page_size}, offset must not be negative"
+            )
+
+        archived = self.filter_applications(
+            request,
+            ArchivedApplication.objects.exclude(status=ApplicationStatus.DELETED),
+        )
+        columns = ["id", "created_at", "total_price", "is_archived"]
+        ordering = request.query_params.get("ordering") or "created_at"
+        page = list(
+            applications.order_by()
+            .annotate(is_archived=Value(False))
+            .values_list(*columns)
+            .union(
+                archived.order_by()
+                .annotate(is_archived=Value(True))
+                .values_list(*columns),
+                all=True,
+            )
+            .order_by(ordering, "id")[offset : offset + limit + 1]
+        )
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        live = self.model_class.objects.prefetch_related("services__service").in_bulk(
+            [pk for pk, _, _, is_archived in page if not is_archived]
+        )
+        old = ArchivedApplication.objects.prefetch_related("services__service").in_bulk(
+            [pk for pk, _, _, is_archived in page if is_archived]
+        )
+        data = []
+        for pk, _, _, is_archived in page:
+            # A row archived between the two queries is left out of this page.
+            row = old.get(pk) if is_archived else live.get(pk)
+            if row is None:
+                continue
+            serializer_class = (
+                ArchivedApplicationSerializer if is_archived else self.serializer_class
+            )
+            data.append(serializer_class(row).data)
+        return Response(
+            {"status": "success", "data": data, "has_more": has_more},
+            status=status.HTTP_200_OK,
+        )
+
+    def get_changes(self, request, token):
+        applications = self.model_class.objects.exclude(
+            status=ApplicationStatus.DRAFT
+        ).prefetch_related("services__service")
+
+        if not request.user.is_staff:
+            applications = applications.filter(user_creator=request.user)
+
+        if token:
+            try:
+                updated_at, pk = decode_sync_token(token)
+            except ValueError as e:
+                return Response(
+                    {"status": "error", "detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            applications = applications.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+            )
+
+        try:
+            # Rows in still-open transactions may commit with an earlier
+            # updated_at; holding back the newest ones keeps them from being
+            # skipped by the token.
+            horizon = timezone.now() - timedelta(
+                seconds=settings.APPLICATION_SYNC_SAFETY_WINDOW
+            )
+            page_size = settings.APPLICATION_SYNC_PAGE_SIZE
+            changed = list(
+                applications.filter(updated_at__lte=horizon).order_by(
+                    "updated_at", "id"
+                )[: page_size + 1]
+            )
+            has_more = len(changed) > page_size
+            changed = changed[:page_size]
+
+            live = [app for app in changed if app.status != ApplicationStatus.DELETED]
+            deleted = [
+                {"pk": app.pk, "updated_at": app.updated_at}
+                for app in changed
+                if app.status == ApplicationStatus.DELETED
+            ]
+            next_token = (
+                encode_sync_token(changed[-1].updated_at, changed[-1].pk)
+                if changed
+                else token
+            )
+            serializer = self.serializer_class(live, many=True)
             return Response(
-                {"status": "success", "data": serializer.data},
+                {
+                    "status": "success",
+                    "data": serializer.data,
+                    "deleted": deleted,
+                    "sync_token": next_token,
+                    "has_more": has_more,
+                },
                 status=status.HTTP_200_OK,
             )
         except Exception as e:
@@ -216,6 +714,96 @@ class ApplicationList(APIView):
             )
 
 
+class ApplicationExport(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Выгрузка заявок с услугами в CSV/NDJSON (потоково)",
+        manual_parameters=[
+            openapi.Parameter(
+                "output",
+                openapi.IN_QUERY,
+                description="Формат выгрузки: csv или ndjson",
+                type=openapi.TYPE_STRING,
+                enum=list(EXPORT_FORMATS),
+            ),
+            openapi.Parameter(
+                "status",
+                openapi.IN_QUERY,
+                description="Фильтр по статусам через запятую",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "created_from",
+                openapi.IN_QUERY,
+                description="Дата создания от (ISO)",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "created_to",
+                openapi.IN_QUERY,
+                description="Дата создания до (ISO)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        tags=["applications"],
+    )
+    def get(self, request, format=None):
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"status": "error", "detail": "Invalid output. Allowed: csv, ndjson."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        status_param = request.query_params.get("status", "")
+        statuses = [name for name in status_param.split(",") if name]
+
+        try:
+            rows = export_rows(
+                statuses=statuses,
+                created_from=request.query_params.get("created_from"),
+                created_to=request.query_params.get("created_to"),
+            )
+        except ExportError as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        lines = iter_export(output, rows)
+        if isinstance(request._request, ASGIRequest):
+            lines = aiter_export(lines)
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[output])
+        response["Content-Disposition"] = (
+            f'attachment; filename="applications.{output}"'
+        )
+        return response
+
+
+class ApplicationEvents(View):
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+            "last_event_id"
+        )
+        if parse_event_id(last_event_id) is None:
+            last_event_id = None
+
+        response = StreamingHttpResponse(
+            stream_events(user, last_event_id), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class ApplicationDetail(APIView):
     model_class = Application
     serializer_class = ApplicationSerializer
@@ -224,13 +812,33 @@ class ApplicationDetail(APIView):
 
     @swagger_auto_schema(
         operation_summary="Получить одну заявку по ID",
+        manual_parameters=[
+            openapi.Parameter(
+                "include_archived",
+                openapi.IN_QUERY,
+                description="Искать также в архиве (true)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
         responses={200: ApplicationSerializer},
         tags=["application"],
     )
     def get(self, request, pk, format=None):
         try:
-            application = get_object_or_404(self.model_class, pk=pk)
-            serializer = self.serializer_class(application)
+            application = self.model_class.objects.filter(pk=pk).first()
+            serializer_class = self.serializer_class
+            if application is None and (
+                request.query_params.get("include_archived") == "true"
+            ):
+                application = ArchivedApplication.objects.filter(pk=pk).first()
+                serializer_class = ArchivedApplicationSerializer
+            if application is None:
+                return Response(
+                    {"status": "error", "detail": "Заявка не найдена"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            serializer = serializer_class(application)
             return Response(
                 {"status": "success", "data": serializer.data},
                 status=status.HTTP_200_OK,
@@ -266,9 +874,18 @@ class ApplicationDetail(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            application.status = new_status
-            application.user_moderator = request.user
-            application.save()
+            # Another moderator's live claim wins over this decision.
+            previous_status = application.transition_to(
+                new_status,
+                condition=Q(claimed_until__isnull=True)
+                | Q(claimed_until__lt=timezone.now())
+                | Q(user_moderator=request.user),
+                user_moderator=request.user,
+                claimed_until=None,
+            )
+            if new_status == ApplicationStatus.REJECTED:
+                capacity.release_on_commit(application)
+            notify_status_change(application, previous_status, request.user)
 
             serializer = self.serializer_class(application)
             return Response(
@@ -279,6 +896,11 @@ class ApplicationDetail(APIView):
                 },
                 status=status.HTTP_200_OK,
             )
+        except TransitionConflict as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_409_CONFLICT,
+            )
         except Exception as e:
             return Response(
                 {"status": "error", "detail": str(e)},
@@ -294,8 +916,10 @@ class ApplicationDetail(APIView):
         try:
             application = get_object_or_404(self.model_class, pk=pk)
 
-            application.status = ApplicationStatus.DELETED
-            application.save()
+            previous_status = application.transition_to(ApplicationStatus.DELETED)
+            if previous_status in capacity.RESERVED_STATUSES:
+                capacity.release_on_commit(application)
+            notify_status_change(application, previous_status, request.user)
 
             serializer = self.serializer_class(application)
             return Response(
@@ -306,6 +930,58 @@ class ApplicationDetail(APIView):
                 },
                 status=status.HTTP_200_OK,
             )
+        except TransitionConflict as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ApplicationClaim(APIView):
+    model_class = Application
+    serializer_class = ApplicationSerializer
+
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Взять в работу следующие сформированные заявки",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={"limit": openapi.Schema(type=openapi.TYPE_INTEGER)},
+        ),
+        responses={200: ApplicationSerializer(many=True)},
+        tags=["applications"],
+    )
+    def post(self, request, format=None):
+        try:
+            limit = int(request.data.get("limit", 1))
+        except (TypeError, ValueError):
+            limit = 0
+        if not 0 < limit <= settings.APPLICATION_CLAIM_MAX:
+            return Response(
+                {
+                    "status": "error",
+                    "detail": f"limit must be between 1 and {settings.APPLICATION_CLAIM_MAX}",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            applications = self.model_class.claim_next(
+                request.user,
+                limit,
+                timedelta(seconds=settings.APPLICATION_CLAIM_LEASE),
+            ).prefetch_related("services__service")
+            serializer = self.serializer_class(applications, many=True)
+            return Response(
+                {"status": "success", "data": serializer.data},
+                status=status.HTTP_200_OK,
+            )
         except Exception as e:
             return Response(
                 {"status": "error", "detail": str(e)},
@@ -324,6 +1000,7 @@ class ApplicationFormed(APIView):
         responses={200: ApplicationSerializer},
         tags=["application/formed"],
     )
+    @idempotent
     def put(self, request, pk, format=None):
         try:
             application = get_object_or_404(self.model_class, pk=pk)
@@ -334,8 +1011,21 @@ class ApplicationFormed(APIView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
-            application.status = ApplicationStatus.FORMED
-            application.save()
+            reserved = capacity.reserve(application)
+            try:
+                with transaction.atomic():
+                    previous_status = application.transition_to(
+                        ApplicationStatus.FORMED
+                    )
+                    application.snapshot_prices()
+                    popularity.record(
+                        application.services.values_list("service_id", flat=True),
+                        popularity.FORM_WEIGHT,
+                    )
+                    notify_status_change(application, previous_status, request.user)
+            except Exception:
+                capacity.release(reserved)
+                raise
 
             serializer = self.serializer_class(application)
             return Response(
@@ -346,6 +1036,11 @@ class ApplicationFormed(APIView):
                 },
                 status=status.HTTP_200_OK,
             )
+        except (TransitionConflict, capacity.CapacityExceeded) as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_409_CONFLICT,
+            )
         except Exception as e:
             return Response(
                 {"status": "error", "detail": str(e)},
@@ -392,6 +1087,7 @@ class ApplicationDeleteServer(APIView):
                 )
 
             app_service.delete()
+            application.save(update_fields=["updated_at"])
             return Response(
                 {
                     "status": "success",
@@ -428,6 +1124,7 @@ class RegisterView(APIView):
         responses={201: RegisterSerializer},
         tags=["user"],
     )
+    @idempotent
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
@@ -466,8 +1163,13 @@ class LoginView(APIView):
 
             log_key = "auth:logins"
             log_entry = f"{user.username} logged in at {timestamp}"
-            redis_client.lpush(log_key, log_entry)
-            redis_client.ltrim(log_key, 0, 99)
+            try:
+                pipe = redis_client.pipeline()
+                pipe.lpush(log_key, log_entry)
+                pipe.ltrim(log_key, 0, 99)
+                pipe.execute()
+            except redis.RedisError:
+                logger.warning("Skipping login audit for %s", user.username)
 
             return Response({"message": "Вход выполнен"})
         else:
@@ -487,6 +1189,77 @@ class LogoutView(APIView):
         return Response({"message": "Выход выполнен"}, status=status.HTTP_200_OK)
 
 
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Метрики Redis и фоновых задач",
+        tags=["metrics"],
+    )
+    def get(self, request):
+        try:
+            jobs = job_metrics()
+        except redis.RedisError:
+            jobs = None
+        return Response(
+            {
+                "status": "success",
+                "data": {"redis": redis_client.stats(), "jobs": jobs},
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProfileList(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Последние профили запросов (cProfile + SQL)",
+        tags=["metrics"],
+    )
+    def get(self, request):
+        try:
+            return Response(
+                {"status": "success", "data": recent_profiles()},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ProfileDetail(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Скачать профиль запроса по ID",
+        tags=["metrics"],
+    )
+    def get(self, request, profile_id):
+        try:
+            capture = load_profile(profile_id)
+            if capture is None:
+                return Response(
+                    {"status": "error", "detail": "Профиль не найден или истёк"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            response = Response(
+                {"status": "success", "data": capture},
+                status=status.HTTP_200_OK,
+            )
+            response["Content-Disposition"] = (
+                f'attachment; filename="profile-{profile_id}.json"'
+            )
+            return response
+        except Exception as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class DraftApplicationServiceView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -502,6 +1275,7 @@ class DraftApplicationServiceView(APIView):
         responses={200: ApplicationSerializer},
         tags=["application/draft"],
     )
+    @idempotent
     def post(self, request):
         user = request.user
         service_id = request.data.get("service_id")
@@ -520,20 +1294,27 @@ class DraftApplicationServiceView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        application, _ = Application.objects.get_or_create(
-            user_creator=user,
-            status=ApplicationStatus.DRAFT,
-        )
-
-        if ApplicationService.objects.filter(
-            application=application, service=service
-        ).exists():
-            return Response(
-                {"detail": "Услуга уже добавлена в черновик"},
-                status=status.HTTP_400_BAD_REQUEST,
+        with transaction.atomic():
+            # The row lock makes purge_stale_drafts skip a draft being edited;
+            # if the purge got there first, a fresh draft is created.
+            drafts = Application.objects.select_for_update()
+            application, created = drafts.get_or_create(
+                user_creator=user,
+                status=ApplicationStatus.DRAFT,
             )
 
-        ApplicationService.objects.create(application=application, service=service)
+            if ApplicationService.objects.filter(
+                application=application, service=service
+            ).exists():
+                return Response(
+                    {"detail": "Услуга уже добавлена в черновик"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            ApplicationService.objects.create(application=application, service=service)
+            if not created:
+                application.save(update_fields=["updated_at"])
+        popularity.record([service.pk], popularity.ADD_WEIGHT)
 
         serializer = ApplicationSerializer(application)
         return Response(
@@ -564,3 +1345,44 @@ class DraftApplicationServiceView(APIView):
             {"status": "success", "data": serializer.data},
             status=status.HTTP_200_OK,
         )
+
+
+class BatchView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Выполнить несколько запросов к API за один вызов",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["requests"],
+            properties={
+                "requests": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=["path"],
+                        properties={
+                            "method": openapi.Schema(type=openapi.TYPE_STRING),
+                            "path": openapi.Schema(type=openapi.TYPE_STRING),
+                            "body": openapi.Schema(type=openapi.TYPE_OBJECT),
+                            "headers": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        },
+                    ),
+                )
+            },
+        ),
+        tags=["batch"],
+    )
+    def post(self, request, format=None):
+        try:
+            data = request.data if isinstance(request.data, dict) else {}
+            sub_requests = parse_batch(data.get("requests"))
+        except BatchError as e:
+            return Response(
+                {"status": "error", "detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"status": "success", "data": run_batch(request._request, sub_requests)},
+            status=status.HTTP_200_OK,
+        )